@@ -1,32 +1,111 @@
-from flask import Flask, request, jsonify, session
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, send_from_directory, session
 from flask_cors import CORS
-from models import db, User, SellerProfile, AdminProfile, Product, Message, Order, OrderItem
+from models import db, User, SellerProfile, AdminProfile, Product, Message, Order, OrderItem, Job, ProductRecommendation
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime
+from sqlalchemy import case
+from itertools import chain, groupby
+from operator import itemgetter
 import os
 import uuid
 from app_auth import check_admin_auth, check_seller_auth
+from config import Config
+from database import init_routing, read_replica
 from routes.mpesa import mpesa_routes
+from payments import MpesaReconciler, CallbackWriter
+from events import EventBroker
+from message_buffer import MessageBuffer
+from message_search import search_messages
+from catalog import CatalogCache
+from compression import Compressor
+from exports import EXPORT_FORMATS, export_response
+from jobs import JobRunner, enqueue, task
+from product_import import detect_format, import_products, read_rows
+from facets import FacetDeltas, category_facets
+import recommendations  # registers the refresh_recommendations task
+from seller_approval import SELLER_DECISIONS, SELLER_STATUSES, SellerStatusCounts, decide_sellers
+from rate_limit import RateLimiter
+from slow_queries import SlowQueryLog
+from profiling import RequestProfiler
+from json_provider import FastJSONProvider, records
+from server import start_background_workers
+import metrics
+import time
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+pymysql://root:@localhost/kukuhub'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.secret_key = 'your_secret_key'  # Change this to a secure key in production
+api = Blueprint('api', __name__)
 
-# Configure upload folder for product images
-UPLOAD_FOLDER = 'static/uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Settles payments whose M-Pesa callback never arrived
+reconciler = MpesaReconciler()
+# Commits M-Pesa callback outcomes in micro-batches off the request path
+callback_writer = CallbackWriter()
+# Pushes new message and order notifications to sellers over SSE
+event_broker = EventBroker()
+# Runs deferred work (seller notifications, ...) from the jobs table
+job_runner = JobRunner()
+# Serialized public product list
+catalog_cache = CatalogCache()
+# Per-status seller counts for the admin approval queue
+seller_status_counts = SellerStatusCounts()
+# Throttles logins, STK pushes and buyer messages (limits in rate_limit.py)
+rate_limiter = RateLimiter()
+# gzip/brotli for large JSON responses
+compressor = Compressor()
+# Off unless SLOW_QUERY_THRESHOLD_MS is set
+slow_query_log = SlowQueryLog()
+# Profiles single requests on demand or 1-in-N per endpoint
+request_profiler = RequestProfiler()
 
-CORS(app, supports_credentials=True)
-db.init_app(app)
-
-# Register blueprints
-app.register_blueprint(mpesa_routes, url_prefix='/api/mpesa')
+def create_app(config=None):
+    """Create the Flask app; settings come from the environment (see config.py) unless `config` is given"""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_object(config or Config())
+    
+    # Behind a load balancer, take the client address from X-Forwarded-For (IP rate limits need it)
+    if app.config.get('TRUSTED_PROXIES'):
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+    
+    # Configure upload folder for product images
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    
+    CORS(app, supports_credentials=True)
+    db.init_app(app)
+    init_routing(app)
+    
+    # Register blueprints
+    app.register_blueprint(api)
+    app.register_blueprint(mpesa_routes, url_prefix='/api/mpesa')
+    
+    reconciler.init_app(app)
+    callback_writer.init_app(app)
+    event_broker.init_app(app)
+    message_buffer.init_app(app)
+    job_runner.init_app(app)
+    catalog_cache.init_app(app)
+    seller_status_counts.init_app(app)
+    compressor.init_app(app)
+    rate_limiter.init_app(app)
+    slow_query_log.init_app(app)
+    request_profiler.init_app(app)
+    
+    metrics.init_app(app)
+    metrics.register_gauge(
+        'mpesa_reconcile_oldest_pending_age_seconds',
+        'Age of the oldest payment still waiting for reconciliation',
+        lambda: reconciler.metrics()['oldest_pending_age_seconds']
+    )
+    metrics.register_gauge(
+        'mpesa_reconcile_last_settle_lag_seconds',
+        'Longest time from order creation to settlement in the last reconciliation run',
+        lambda: reconciler.metrics()['last_settle_lag_seconds']
+    )
+    
+    return app
 
 # User registration and authentication routes
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def register():
     data = request.json
     
@@ -55,7 +134,7 @@ def register():
         print(f"Error during registration: {str(e)}")
         return jsonify({'success': False, 'message': f'Registration failed: {str(e)}'})
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     data = request.json
     
@@ -76,7 +155,7 @@ def login():
         'email': user.email
     })
 
-@app.route('/api/check-auth', methods=['GET'])
+@api.route('/api/check-auth', methods=['GET'])
 def check_auth():
     if 'user_id' in session:
         user_id = session['user_id']
@@ -92,14 +171,14 @@ def check_auth():
     
     return jsonify({'isAuthenticated': False})
 
-@app.route('/api/logout', methods=['POST'])
+@api.route('/api/logout', methods=['POST'])
 def logout():
     # Clear the session
     session.clear()
     return jsonify({'success': True, 'message': 'Logged out successfully'})
 
 # Seller routes
-@app.route('/api/seller/register', methods=['POST'])
+@api.route('/api/seller/register', methods=['POST'])
 def seller_register():
     data = request.json
     
@@ -122,7 +201,9 @@ def seller_register():
         )
         
         db.session.add(new_seller)
+        as_of = time.monotonic()
         db.session.commit()
+        seller_status_counts.adjust({'pending': 1}, as_of)
         
         return jsonify({'success': True, 'message': 'Seller registered successfully'})
     
@@ -131,7 +212,7 @@ def seller_register():
         print(f"Error during seller registration: {str(e)}")
         return jsonify({'success': False, 'message': f'Registration failed: {str(e)}'})
 
-@app.route('/api/seller/login', methods=['POST'])
+@api.route('/api/seller/login', methods=['POST'])
 def seller_login():
     data = request.json
     
@@ -154,11 +235,11 @@ def seller_login():
         'approval_status': seller.approval_status
     })
 
-@app.route('/api/seller/check-auth', methods=['GET'])
+@api.route('/api/seller/check-auth', methods=['GET'])
 def seller_auth_check():
     return check_seller_auth()
 
-@app.route('/api/seller/update-profile', methods=['PUT'])
+@api.route('/api/seller/update-profile', methods=['PUT'])
 def update_seller_profile():
     """Update seller profile information"""
     # First check if seller is authenticated
@@ -188,6 +269,8 @@ def update_seller_profile():
             seller.phone_number = data['phone_number']
         
         db.session.commit()
+        # Business names appear in the product list
+        catalog_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -200,7 +283,7 @@ def update_seller_profile():
         return jsonify({'success': False, 'message': f'Update failed: {str(e)}'})
 
 # Admin routes
-@app.route('/api/admin/login', methods=['POST'])
+@api.route('/api/admin/login', methods=['POST'])
 def admin_login():
     data = request.json
     
@@ -223,11 +306,11 @@ def admin_login():
         'department': admin.department
     })
 
-@app.route('/api/admin/check-auth', methods=['GET'])
+@api.route('/api/admin/check-auth', methods=['GET'])
 def admin_auth_check():
     return check_admin_auth()
 
-@app.route('/api/admin/update-profile', methods=['PUT'])
+@api.route('/api/admin/update-profile', methods=['PUT'])
 def update_admin_profile():
     """Update admin profile information"""
     # First check if admin is authenticated
@@ -266,7 +349,7 @@ def update_admin_profile():
         print(f"Error updating admin profile: {str(e)}")
         return jsonify({'success': False, 'message': f'Update failed: {str(e)}'})
 
-@app.route('/api/admin/products/<product_id>', methods=['DELETE'])
+@api.route('/api/admin/products/<product_id>', methods=['DELETE'])
 def admin_delete_product(product_id):
     """Admin delete a product"""
     # First check if admin is authenticated
@@ -282,8 +365,12 @@ def admin_delete_product(product_id):
         if not product:
             return jsonify({'success': False, 'message': 'Product not found'})
         
+        facets = FacetDeltas()
+        facets.remove(product.category, product.price, product.stock)
         db.session.delete(product)
+        facets.apply()
         db.session.commit()
+        catalog_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -296,41 +383,101 @@ def admin_delete_product(product_id):
         return jsonify({'success': False, 'message': f'Error deleting product: {str(e)}'})
 
 # Product routes
-@app.route('/api/products', methods=['GET'])
+PRODUCT_LIST_KEYS = ('id', 'name', 'description', 'price', 'stock', 'category', 'image', 'sellerId', 'sellerName', 'createdAt')
+
+RELATED_PRODUCT_KEYS = PRODUCT_LIST_KEYS + ('score', 'coOrders')
+RELATED_PRODUCTS_LIMIT = 20
+
+def product_list_columns(seller_name):
+    """Columns in PRODUCT_LIST_KEYS order, shaped in SQL so rows serialize as they are"""
+    return (
+        db.cast(Product.product_id, db.String),
+        Product.name,
+        Product.description,
+        Product.price,
+        Product.stock,
+        Product.category,
+        Product.image_url,
+        db.cast(Product.seller_id, db.String),
+        seller_name,
+        Product.created_at
+    )
+
+def build_catalog():
+    """Build the public product list payload (cached by catalog_cache)"""
+    # One joined query of plain tuples instead of a seller lookup per product
+    rows = db.session.execute(
+        db.select(*product_list_columns(db.func.coalesce(SellerProfile.business_name, 'Unknown Seller')))
+        .outerjoin(SellerProfile, SellerProfile.seller_id == Product.seller_id)
+        .order_by(Product.product_id)
+    )
+    
+    return {
+        'success': True,
+        'products': records(PRODUCT_LIST_KEYS, rows)
+    }
+
+@api.route('/api/products', methods=['GET'])
+@read_replica
 def get_products():
     """Get all products for public viewing"""
     try:
-        products = Product.query.all()
-        product_list = []
-        
-        for product in products:
-            # Get seller info
-            seller = SellerProfile.query.get(product.seller_id)
-            seller_name = seller.business_name if seller else "Unknown Seller"
-            
-            product_list.append({
-                'id': str(product.product_id),
-                'name': product.name,
-                'description': product.description,
-                'price': product.price,
-                'stock': product.stock,
-                'category': product.category,
-                'image': product.image_url,
-                'sellerId': str(product.seller_id),
-                'sellerName': seller_name,
-                'createdAt': product.created_at.isoformat()
-            })
+        body, encoding = catalog_cache.get_encoded(build_catalog, compressor)
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+    
+    except Exception as e:
+        print(f"Error fetching products: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error fetching products: {str(e)}'})
+
+@api.route('/api/products/facets', methods=['GET'])
+@read_replica
+def get_product_facets():
+    """Per-category product and in-stock counts with price histograms, for the catalog filters"""
+    try:
+        return jsonify({
+            'success': True,
+            'categories': category_facets()
+        })
+    
+    except Exception as e:
+        print(f"Error fetching product facets: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error fetching facets: {str(e)}'})
+
+@api.route('/api/products/<product_id>/related', methods=['GET'])
+@read_replica
+def get_related_products(product_id):
+    """Products most often bought together with this one, from the precomputed lists"""
+    try:
+        limit = min(max(request.args.get('limit', RELATED_PRODUCTS_LIMIT, type=int), 1), RELATED_PRODUCTS_LIMIT)
+        # A primary-key range read of the product's list, best first
+        rows = db.session.execute(
+            db.select(
+                *product_list_columns(db.func.coalesce(SellerProfile.business_name, 'Unknown Seller')),
+                ProductRecommendation.score,
+                ProductRecommendation.co_orders
+            )
+            .select_from(ProductRecommendation)
+            .join(Product, Product.product_id == ProductRecommendation.related_product_id)
+            .outerjoin(SellerProfile, SellerProfile.seller_id == Product.seller_id)
+            .where(ProductRecommendation.product_id == int(product_id))
+            .order_by(ProductRecommendation.rank)
+            .limit(limit)
+        )
         
         return jsonify({
             'success': True,
-            'products': product_list
+            'products': records(RELATED_PRODUCT_KEYS, rows)
         })
     
     except Exception as e:
-        print(f"Error fetching products: {str(e)}")
-        return jsonify({'success': False, 'message': f'Error fetching products: {str(e)}'})
+        print(f"Error fetching related products: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error fetching related products: {str(e)}'})
 
-@app.route('/api/products/<product_id>', methods=['GET'])
+@api.route('/api/products/<product_id>', methods=['GET'])
+@read_replica
 def get_product(product_id):
     """Get a specific product by ID"""
     try:
@@ -366,7 +513,8 @@ def get_product(product_id):
         print(f"Error fetching product: {str(e)}")
         return jsonify({'success': False, 'message': f'Error fetching product: {str(e)}'})
 
-@app.route('/api/seller/products', methods=['GET'])
+@api.route('/api/seller/products', methods=['GET'])
+@read_replica
 def get_seller_products():
     """Get products for the authenticated seller"""
     # First check if seller is authenticated
@@ -378,33 +526,22 @@ def get_seller_products():
     
     try:
         seller_id = auth_data.get('seller_id')
-        products = Product.query.filter_by(seller_id=seller_id).all()
-        product_list = []
-        
-        for product in products:
-            product_list.append({
-                'id': str(product.product_id),
-                'name': product.name,
-                'description': product.description,
-                'price': product.price,
-                'stock': product.stock,
-                'category': product.category,
-                'image': product.image_url,
-                'sellerId': str(product.seller_id),
-                'sellerName': auth_data.get('business_name'),
-                'createdAt': product.created_at.isoformat()
-            })
+        rows = db.session.execute(
+            db.select(*product_list_columns(db.literal(auth_data.get('business_name'))))
+            .where(Product.seller_id == seller_id)
+            .order_by(Product.product_id)
+        )
         
         return jsonify({
             'success': True,
-            'products': product_list
+            'products': records(PRODUCT_LIST_KEYS, rows)
         })
     
     except Exception as e:
         print(f"Error fetching seller products: {str(e)}")
         return jsonify({'success': False, 'message': f'Error fetching products: {str(e)}'})
 
-@app.route('/api/products/create', methods=['POST'])
+@api.route('/api/products/create', methods=['POST'])
 def add_product():
     """Add a new product (seller only)"""
     # First check if seller is authenticated
@@ -431,7 +568,7 @@ def add_product():
                 if file and file.filename != '':
                     # Generate unique filename
                     filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{file.filename}"
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
                     
                     # Ensure directory exists
                     os.makedirs(os.path.dirname(file_path), exist_ok=True)
@@ -469,7 +606,11 @@ def add_product():
             )
         
         db.session.add(new_product)
+        facets = FacetDeltas()
+        facets.add(new_product.category, new_product.price, new_product.stock)
+        facets.apply()
         db.session.commit()
+        catalog_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -482,7 +623,53 @@ def add_product():
         print(f"Error adding product: {str(e)}")
         return jsonify({'success': False, 'message': f'Error adding product: {str(e)}'})
 
-@app.route('/api/products/<product_id>', methods=['PUT'])
+@api.route('/api/products/import', methods=['POST'])
+def bulk_import_products():
+    """Import many products from a CSV or JSON-lines file (seller only).
+
+    Send the file as the `file` field of a multipart form, or as the raw body
+    with a text/csv or application/x-ndjson content type (or ?format=csv|jsonl).
+    Columns: name, description, price, stock, category, image_url.
+    """
+    auth_check = check_seller_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Seller not authenticated'})
+    
+    # The raw body is read as it arrives; multipart uploads are spooled to a temp file first
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        import_format = detect_format(request.args.get('format'), upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        import_format = detect_format(request.args.get('format'), None, request.mimetype)
+    if import_format is None:
+        return jsonify({'success': False, 'message': 'Upload a .csv or .jsonl file'}), 400
+    
+    try:
+        summary = import_products(
+            read_rows(stream, import_format),
+            auth_data.get('seller_id'),
+            batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+            max_rows=current_app.config['IMPORT_MAX_ROWS']
+        )
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error importing products: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error importing products: {str(e)}'})
+    finally:
+        # One rebuild for the whole file rather than one per batch
+        catalog_cache.invalidate()
+    
+    return jsonify({
+        'success': summary['aborted'] is None,
+        'message': summary['aborted'] or f"Imported {summary['imported']} products, {summary['failed']} rows failed",
+        **summary
+    })
+
+@api.route('/api/products/<product_id>', methods=['PUT'])
 def update_product(product_id):
     """Update product details (seller only)"""
     # First check if seller is authenticated
@@ -504,6 +691,7 @@ def update_product(product_id):
             return jsonify({'success': False, 'message': 'You do not own this product'})
         
         data = request.json
+        before = (product.category, product.price, product.stock)
         
         # Update fields
         if 'name' in data:
@@ -520,7 +708,11 @@ def update_product(product_id):
             product.image_url = data['image']
             
         product.updated_at = datetime.utcnow()
+        facets = FacetDeltas()
+        facets.change(before, (product.category, product.price, product.stock))
+        facets.apply()
         db.session.commit()
+        catalog_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -532,7 +724,92 @@ def update_product(product_id):
         print(f"Error updating product: {str(e)}")
         return jsonify({'success': False, 'message': f'Error updating product: {str(e)}'})
 
-@app.route('/api/products/<product_id>', methods=['DELETE'])
+PRODUCTS_BULK_LIMIT = 1000
+
+def parse_product_updates(updates):
+    """Turn [{productId, price?, stock?}, ...] into ({id: price}, {id: stock}, errors); later entries win"""
+    prices, stocks, errors = {}, {}, []
+    for index, update in enumerate(updates):
+        try:
+            product_id = int(update['productId'])
+            if 'price' not in update and 'stock' not in update:
+                raise ValueError('price or stock is required')
+            if 'price' in update:
+                price = float(update['price'])
+                if not price >= 0:
+                    raise ValueError('price must be zero or more')
+                prices[product_id] = price
+            if 'stock' in update:
+                stock = int(update['stock'])
+                if stock < 0:
+                    raise ValueError('stock must be zero or more')
+                stocks[product_id] = stock
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append({'index': index, 'message': str(e) if isinstance(e, ValueError) else 'productId is required'})
+    return prices, stocks, errors
+
+@api.route('/api/seller/products', methods=['PUT'])
+def bulk_update_products():
+    """Change the price and/or stock of many of the seller's products in one statement"""
+    auth_check = check_seller_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Seller not authenticated'})
+    
+    try:
+        seller_id = int(auth_data.get('seller_id'))
+        updates = (request.json or {}).get('updates')
+        if not isinstance(updates, list) or not updates:
+            return jsonify({'success': False, 'message': 'Provide updates: [{productId, price, stock}, ...]'})
+        if len(updates) > PRODUCTS_BULK_LIMIT:
+            return jsonify({'success': False, 'message': f'At most {PRODUCTS_BULK_LIMIT} products can be updated at once'})
+        
+        prices, stocks, errors = parse_product_updates(updates)
+        if errors:
+            return jsonify({'success': False, 'message': 'Some updates are invalid', 'errors': errors})
+        
+        # One query proves ownership of the whole batch; nothing is applied unless it all belongs to the seller
+        product_ids = prices.keys() | stocks.keys()
+        owned = {row[0]: row[1:] for row in db.session.query(
+            Product.product_id, Product.category, Product.price, Product.stock
+        ).filter(Product.product_id.in_(product_ids), Product.seller_id == seller_id)}
+        if owned.keys() != product_ids:
+            return jsonify({
+                'success': False,
+                'message': 'Some products were not found or are not yours',
+                'productIds': sorted(product_ids - owned.keys())
+            })
+        
+        values = {Product.updated_at: datetime.utcnow()}
+        if prices:
+            values[Product.price] = case(prices, value=Product.product_id, else_=Product.price)
+        if stocks:
+            values[Product.stock] = case(stocks, value=Product.product_id, else_=Product.stock)
+        # The seller filter is repeated so a product changing hands meanwhile is never touched
+        updated = Product.query.filter(
+            Product.product_id.in_(product_ids), Product.seller_id == seller_id
+        ).update(values, synchronize_session=False)
+        facets = FacetDeltas()
+        for product_id, (category, price, stock) in owned.items():
+            facets.change((category, price, stock),
+                          (category, prices.get(product_id, price), stocks.get(product_id, stock)))
+        facets.apply()
+        db.session.commit()
+        catalog_cache.invalidate()
+        
+        return jsonify({
+            'success': True,
+            'message': f'{updated} products updated',
+            'updated': updated
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error updating products: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error updating products: {str(e)}'})
+
+@api.route('/api/products/<product_id>', methods=['DELETE'])
 def delete_product(product_id):
     """Delete a product (seller only)"""
     # First check if seller is authenticated
@@ -553,8 +830,12 @@ def delete_product(product_id):
         if product.seller_id != int(seller_id):
             return jsonify({'success': False, 'message': 'You do not own this product'})
         
+        facets = FacetDeltas()
+        facets.remove(product.category, product.price, product.stock)
         db.session.delete(product)
+        facets.apply()
         db.session.commit()
+        catalog_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -566,7 +847,7 @@ def delete_product(product_id):
         print(f"Error deleting product: {str(e)}")
         return jsonify({'success': False, 'message': f'Error deleting product: {str(e)}'})
 
-@app.route('/api/upload/product-image', methods=['POST'])
+@api.route('/api/upload/product-image', methods=['POST'])
 def upload_product_image():
     """Upload a product image and return the URL"""
     # Check authentication first
@@ -586,7 +867,7 @@ def upload_product_image():
         
         # Generate unique filename
         filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{file.filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         
         # Save file
         file.save(file_path)
@@ -604,44 +885,92 @@ def upload_product_image():
         return jsonify({'success': False, 'message': f'Error uploading image: {str(e)}'})
 
 # Message Endpoints
-@app.route('/api/messages/send', methods=['POST'])
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+MESSAGES_BULK_LIMIT = 1000
+
+def encode_message_cursor(message):
+    return f"{message.created_at.isoformat()}_{message.message_id}"
+
+def decode_message_cursor(cursor):
+    created_at, message_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(created_at), int(message_id)
+
+def get_unread_message_count(seller_id):
+    return db.session.query(SellerProfile.unread_message_count).filter_by(seller_id=seller_id).scalar() or 0
+
+# Longest values the messages columns take (content is a MySQL TEXT)
+MESSAGE_FIELD_LENGTHS = {'senderName': 100, 'senderEmail': 100, 'productName': 255}
+MESSAGE_CONTENT_MAX_BYTES = 65535
+
+@api.route('/api/messages/send', methods=['POST'])
 def send_message():
-    """Send a message to a seller"""
+    """Send a message to a seller.
+    
+    The message is buffered and written in the next batch, so the response
+    carries no message ID.
+    """
     data = request.json
     
     try:
+        content = (data.get('content') or '').strip()
+        if not content:
+            return jsonify({'success': False, 'message': 'Message content is required'})
+        
         # Validate seller exists
-        seller = SellerProfile.query.get(data['sellerId'])
-        if not seller:
+        seller_id = int(data['sellerId'])
+        if not message_buffer.is_seller(seller_id):
             return jsonify({'success': False, 'message': 'Seller not found'})
         
-        # Create new message
-        new_message = Message(
-            content=data['content'],
-            user_id=None,  # Anonymous message is okay
-            seller_id=int(data['sellerId']),
-            senderName=data.get('senderName', 'Anonymous'),
-            senderEmail=data.get('senderEmail', 'no-email@example.com'),
-            productName=data.get('productName', 'Unknown Product')
-        )
+        message = {
+            'content': content,
+            'user_id': None,  # Anonymous message is okay
+            'seller_id': seller_id,
+            'senderName': data.get('senderName', 'Anonymous'),
+            'senderEmail': data.get('senderEmail', 'no-email@example.com'),
+            'productName': data.get('productName', 'Unknown Product')
+        }
+        # Checked here: a row the database rejects later can only be set aside, not reported
+        if len(content.encode('utf-8')) > MESSAGE_CONTENT_MAX_BYTES:
+            return jsonify({'success': False, 'message': 'Message is too long'})
+        for field, limit in MESSAGE_FIELD_LENGTHS.items():
+            if message[field] is not None:
+                message[field] = str(message[field])
+                if len(message[field]) > limit:
+                    return jsonify({'success': False, 'message': f'{field} is longer than {limit} characters'})
         
-        db.session.add(new_message)
-        db.session.commit()
+        message_buffer.submit(message)
         
         return jsonify({
             'success': True,
-            'message': 'Message sent successfully',
-            'messageId': new_message.message_id
+            'message': 'Message sent successfully'
         })
     
     except Exception as e:
-        db.session.rollback()
         print(f"Error sending message: {str(e)}")
         return jsonify({'success': False, 'message': f'Error sending message: {str(e)}'})
 
-@app.route('/api/seller/messages', methods=['GET'])
+def notify_new_messages(counts):
+    """Tell sellers about messages written by the message buffer"""
+    unread = dict(db.session.query(SellerProfile.seller_id, SellerProfile.unread_message_count).filter(
+        SellerProfile.seller_id.in_(counts)
+    ))
+    for seller_id, count in counts.items():
+        event_broker.publish(seller_id, 'message', {
+            'count': count,
+            'unreadCount': unread.get(seller_id, 0)
+        })
+
+# Buyer messages are throttled per sender and written in batches
+message_buffer = MessageBuffer(on_flush=notify_new_messages)
+
+@api.route('/api/seller/messages', methods=['GET'])
+@read_replica
 def get_seller_messages():
-    """Get messages for the authenticated seller"""
+    """Get a page of messages for the authenticated seller, newest first.
+    
+    Pass the returned `nextCursor` as `?cursor=` to fetch the next (older) page.
+    """
     # Check if seller is authenticated
     auth_check = check_seller_auth()
     auth_data = auth_check.get_json()
@@ -651,7 +980,20 @@ def get_seller_messages():
     
     try:
         seller_id = auth_data.get('seller_id')
-        messages = Message.query.filter_by(seller_id=seller_id).order_by(Message.created_at.desc()).all()
+        limit = min(max(request.args.get('limit', MESSAGES_PAGE_SIZE, type=int), 1), MESSAGES_MAX_PAGE_SIZE)
+        
+        query = Message.query.filter_by(seller_id=seller_id)
+        cursor = request.args.get('cursor')
+        if cursor:
+            created_at, message_id = decode_message_cursor(cursor)
+            query = query.filter(db.or_(
+                Message.created_at < created_at,
+                db.and_(Message.created_at == created_at, Message.message_id < message_id)
+            ))
+        
+        messages = query.order_by(Message.created_at.desc(), Message.message_id.desc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
         message_list = []
         
         for msg in messages:
@@ -667,14 +1009,16 @@ def get_seller_messages():
         
         return jsonify({
             'success': True,
-            'messages': message_list
+            'messages': message_list,
+            'nextCursor': encode_message_cursor(messages[-1]) if has_more else None,
+            'unreadCount': get_unread_message_count(seller_id)
         })
     
     except Exception as e:
         print(f"Error fetching messages: {str(e)}")
         return jsonify({'success': False, 'message': f'Error fetching messages: {str(e)}'})
 
-@app.route('/api/seller/messages/mark-read/<message_id>', methods=['PUT'])
+@api.route('/api/seller/messages/mark-read/<message_id>', methods=['PUT'])
 def mark_message_read(message_id):
     """Mark a message as read"""
     # Check if seller is authenticated
@@ -695,12 +1039,14 @@ def mark_message_read(message_id):
         if message.seller_id != int(seller_id):
             return jsonify({'success': False, 'message': 'This message does not belong to you'})
         
-        message.is_read = True
+        # Conditional update so concurrent requests decrement the counter only once
+        mark_scope_read(seller_id, Message.query.filter(Message.message_id == message.message_id))
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': 'Message marked as read'
+            'message': 'Message marked as read',
+            'unreadCount': get_unread_message_count(seller_id)
         })
     
     except Exception as e:
@@ -708,7 +1054,147 @@ def mark_message_read(message_id):
         print(f"Error marking message as read: {str(e)}")
         return jsonify({'success': False, 'message': f'Error marking message as read: {str(e)}'})
 
-@app.route('/api/seller/messages/count', methods=['GET'])
+@api.route('/api/seller/messages/search', methods=['GET'])
+@read_replica
+def search_seller_messages():
+    """Full-text search over the authenticated seller's messages, best matches first"""
+    auth_check = check_seller_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Seller not authenticated'})
+    
+    try:
+        seller_id = auth_data.get('seller_id')
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'message': 'Search query is required'})
+        
+        limit = min(max(request.args.get('limit', MESSAGES_PAGE_SIZE, type=int), 1), MESSAGES_MAX_PAGE_SIZE)
+        page = max(request.args.get('page', 1, type=int), 1)
+        
+        results, has_more = search_messages(seller_id, query, limit, (page - 1) * limit)
+        message_list = []
+        
+        for msg, score in results:
+            message_list.append({
+                'id': str(msg.message_id),
+                'senderName': msg.senderName,
+                'senderEmail': msg.senderEmail,
+                'message': msg.content,
+                'productName': msg.productName,
+                'isRead': msg.is_read,
+                'createdAt': msg.created_at.isoformat(),
+                'score': float(score)
+            })
+        
+        return jsonify({
+            'success': True,
+            'messages': message_list,
+            'page': page,
+            'hasMore': has_more
+        })
+    
+    except Exception as e:
+        print(f"Error searching messages: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error searching messages: {str(e)}'})
+
+def seller_message_scope(seller_id, data):
+    """Build the ownership-scoped message query for a bulk request.
+    
+    The body selects messages either by `messageIds` or with `before` (an ISO
+    timestamp, meaning every message received before it). Returns (query, error).
+    """
+    query = Message.query.filter(Message.seller_id == seller_id)
+    
+    if data.get('messageIds'):
+        message_ids = [int(message_id) for message_id in data['messageIds']]
+        if len(message_ids) > MESSAGES_BULK_LIMIT:
+            return None, f'At most {MESSAGES_BULK_LIMIT} messages can be updated at once'
+        return query.filter(Message.message_id.in_(message_ids)), None
+    
+    if data.get('before'):
+        return query.filter(Message.created_at < datetime.fromisoformat(data['before'])), None
+    
+    return None, 'Provide messageIds or before'
+
+def mark_scope_read(seller_id, query):
+    """Mark the unread messages in `query` as read and adjust the seller's counter; returns rows changed"""
+    marked = query.filter(Message.is_read == False).update(
+        {Message.is_read: True}, synchronize_session=False
+    )
+    if marked:
+        SellerProfile.query.filter_by(seller_id=seller_id).update(
+            {SellerProfile.unread_message_count: SellerProfile.unread_message_count - marked},
+            synchronize_session=False
+        )
+    return marked
+
+@api.route('/api/seller/messages/mark-read', methods=['PUT'])
+def bulk_mark_messages_read():
+    """Mark many of the authenticated seller's messages as read in one statement"""
+    auth_check = check_seller_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Seller not authenticated'})
+    
+    try:
+        seller_id = auth_data.get('seller_id')
+        query, error = seller_message_scope(seller_id, request.json or {})
+        if error:
+            return jsonify({'success': False, 'message': error})
+        
+        marked = mark_scope_read(seller_id, query)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': f'{marked} messages marked as read',
+            'affected': marked,
+            'unreadCount': get_unread_message_count(seller_id)
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error marking messages as read: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error marking messages as read: {str(e)}'})
+
+@api.route('/api/seller/messages', methods=['DELETE'])
+def bulk_delete_messages():
+    """Delete many of the authenticated seller's messages in one statement"""
+    auth_check = check_seller_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Seller not authenticated'})
+    
+    try:
+        seller_id = auth_data.get('seller_id')
+        query, error = seller_message_scope(seller_id, request.json or {})
+        if error:
+            return jsonify({'success': False, 'message': error})
+        
+        # Marking the doomed unread messages read first locks them and tells us
+        # exactly how much to take off the counter
+        mark_scope_read(seller_id, query)
+        deleted = query.delete(synchronize_session=False)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': f'{deleted} messages deleted',
+            'affected': deleted,
+            'unreadCount': get_unread_message_count(seller_id)
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error deleting messages: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error deleting messages: {str(e)}'})
+
+@api.route('/api/seller/messages/count', methods=['GET'])
+@read_replica
 def get_seller_message_count():
     """Get count of unread messages for the authenticated seller"""
     # Check if seller is authenticated
@@ -720,7 +1206,7 @@ def get_seller_message_count():
     
     try:
         seller_id = auth_data.get('seller_id')
-        unread_count = Message.query.filter_by(seller_id=seller_id, is_read=False).count()
+        unread_count = get_unread_message_count(seller_id)
         
         return jsonify({
             'success': True,
@@ -731,8 +1217,26 @@ def get_seller_message_count():
         print(f"Error fetching message count: {str(e)}")
         return jsonify({'success': False, 'message': f'Error fetching message count: {str(e)}'})
 
+@api.route('/api/seller/events', methods=['GET'])
+def seller_events():
+    """Server-sent event stream of new messages and orders for the authenticated seller"""
+    auth_check = check_seller_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Seller not authenticated'}), 401
+    
+    # Long-lived streams must not hold on to a pooled DB connection
+    db.session.remove()
+    
+    return Response(
+        event_broker.stream(auth_data.get('seller_id')),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # Order Management APIs
-@app.route('/api/orders/create', methods=['POST'])
+@api.route('/api/orders/create', methods=['POST'])
 def create_order():
     """Create a new order"""
     try:
@@ -770,6 +1274,10 @@ def create_order():
             )
             db.session.add(order_item)
         
+        # Saved with the order, so the notification can't be lost or sent for an order that wasn't
+        enqueue('notify_order_sellers', {'order_id': new_order.order_id})
+        # One pending refresh covers every order placed before it runs
+        enqueue('refresh_recommendations', delay=current_app.config['RECOMMEND_REFRESH_DELAY'], unique=True)
         db.session.commit()
         
         return jsonify({
@@ -784,7 +1292,23 @@ def create_order():
         print(f"Error creating order: {str(e)}")
         return jsonify({'success': False, 'message': f'Error creating order: {str(e)}'})
 
-@app.route('/api/orders/update-payment', methods=['PUT'])
+@task(queue='notifications', priority=10, publishes_events=True)
+def notify_order_sellers(order_id):
+    """Tell every seller with products in the order about it over SSE"""
+    order = db.session.get(Order, order_id)
+    if order is None:
+        return
+    seller_ids = db.session.query(Product.seller_id).join(
+        OrderItem, OrderItem.product_id == Product.product_id
+    ).filter(OrderItem.order_id == order_id).distinct()
+    for (seller_id,) in seller_ids:
+        event_broker.publish(seller_id, 'order', {
+            'orderNumber': order.order_number,
+            'status': order.status,
+            'paymentStatus': order.payment_status
+        })
+
+@api.route('/api/orders/update-payment', methods=['PUT'])
 def update_order_payment():
     """Update order payment status"""
     try:
@@ -818,7 +1342,11 @@ def update_order_payment():
         print(f"Error updating order payment: {str(e)}")
         return jsonify({'success': False, 'message': f'Error updating order payment: {str(e)}'})
 
-@app.route('/api/orders/user', methods=['GET'])
+ORDER_PRODUCT_KEYS = ('id', 'name', 'image', 'price', 'quantity')
+SELLER_ORDER_ITEM_KEYS = ('productName', 'quantity', 'unitPrice', 'totalPrice')
+
+@api.route('/api/orders/user', methods=['GET'])
+@read_replica
 def get_user_orders():
     """Get orders for the authenticated user"""
     try:
@@ -827,28 +1355,28 @@ def get_user_orders():
         if not user_id:
             return jsonify({'success': False, 'message': 'User not authenticated'})
         
-        orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
+        # Orders and their items in one query, newest first, instead of two lookups per item
+        rows = db.session.execute(
+            db.select(
+                Order.order_id, Order.order_number, Order.status, db.func.date(Order.created_at), Order.total_amount,
+                db.cast(Product.product_id, db.String), Product.name, Product.image_url,
+                OrderItem.unit_price, OrderItem.quantity
+            )
+            .outerjoin(OrderItem, OrderItem.order_id == Order.order_id)
+            .outerjoin(Product, Product.product_id == OrderItem.product_id)
+            .where(Order.user_id == user_id)
+            .order_by(Order.created_at.desc(), Order.order_id, OrderItem.item_id)
+        )
         order_list = []
         
-        for order in orders:
-            # Get order items with product details
-            items = []
-            for item in order.items:
-                product = item.product
-                items.append({
-                    'id': str(product.product_id),
-                    'name': product.name,
-                    'image': product.image_url,
-                    'price': item.unit_price,
-                    'quantity': item.quantity
-                })
-            
+        for order_id, order_rows in groupby(rows, key=itemgetter(0)):
+            first = next(order_rows)
             order_list.append({
-                'id': order.order_number,
-                'products': items,
-                'status': order.status,
-                'date': order.created_at.strftime('%Y-%m-%d'),
-                'total': order.total_amount
+                'id': first[1],
+                'products': records(ORDER_PRODUCT_KEYS, [row[5:] for row in chain([first], order_rows) if row[5] is not None]),
+                'status': first[2],
+                'date': first[3],
+                'total': first[4]
             })
         
         return jsonify({
@@ -860,7 +1388,8 @@ def get_user_orders():
         print(f"Error fetching user orders: {str(e)}")
         return jsonify({'success': False, 'message': f'Error fetching orders: {str(e)}'})
 
-@app.route('/api/orders/seller', methods=['GET'])
+@api.route('/api/orders/seller', methods=['GET'])
+@read_replica
 def get_seller_orders():
     """Get orders for the authenticated seller"""
     auth_check = check_seller_auth()
@@ -872,35 +1401,32 @@ def get_seller_orders():
     try:
         seller_id = auth_data.get('seller_id')
         
-        # Get orders that contain products from this seller
-        orders = db.session.query(Order).join(OrderItem).join(Product).filter(
-            Product.seller_id == seller_id
-        ).distinct().order_by(Order.created_at.desc()).all()
-        
+        # Only this seller's items, with their orders, in one query
+        rows = db.session.execute(
+            db.select(
+                Order.order_id, Order.order_number, db.func.coalesce(Order.customer_name, 'Guest'),
+                Order.status, Order.payment_status, db.func.date(Order.created_at),
+                Product.name, OrderItem.quantity, OrderItem.unit_price, OrderItem.total_price
+            )
+            .join(OrderItem, OrderItem.order_id == Order.order_id)
+            .join(Product, Product.product_id == OrderItem.product_id)
+            .where(Product.seller_id == seller_id)
+            .order_by(Order.created_at.desc(), Order.order_id, OrderItem.item_id)
+        )
         order_list = []
         
-        for order in orders:
-            # Get only items from this seller
-            seller_items = []
-            for item in order.items:
-                if item.product.seller_id == int(seller_id):
-                    seller_items.append({
-                        'productName': item.product.name,
-                        'quantity': item.quantity,
-                        'unitPrice': item.unit_price,
-                        'totalPrice': item.total_price
-                    })
-            
-            if seller_items:  # Only include orders with items from this seller
-                order_list.append({
-                    'id': order.order_number,
-                    'customerName': order.customer_name or 'Guest',
-                    'items': seller_items,
-                    'status': order.status,
-                    'paymentStatus': order.payment_status,
-                    'date': order.created_at.strftime('%Y-%m-%d'),
-                    'total': sum(item['totalPrice'] for item in seller_items)
-                })
+        for order_id, order_rows in groupby(rows, key=itemgetter(0)):
+            order_rows = list(order_rows)
+            first = order_rows[0]
+            order_list.append({
+                'id': first[1],
+                'customerName': first[2],
+                'items': records(SELLER_ORDER_ITEM_KEYS, [row[6:] for row in order_rows]),
+                'status': first[3],
+                'paymentStatus': first[4],
+                'date': first[5],
+                'total': sum(row[9] for row in order_rows)
+            })
         
         return jsonify({
             'success': True,
@@ -911,7 +1437,8 @@ def get_seller_orders():
         print(f"Error fetching seller orders: {str(e)}")
         return jsonify({'success': False, 'message': f'Error fetching orders: {str(e)}'})
 
-@app.route('/api/orders/admin', methods=['GET'])
+@api.route('/api/orders/admin', methods=['GET'])
+@read_replica
 def get_admin_orders():
     """Get all orders for admin"""
     auth_check = check_admin_auth()
@@ -921,29 +1448,79 @@ def get_admin_orders():
         return jsonify({'success': False, 'message': 'Admin not authenticated'})
     
     try:
-        orders = Order.query.order_by(Order.created_at.desc()).all()
-        order_list = []
-        
-        for order in orders:
-            order_list.append({
-                'id': order.order_number,
-                'customer': order.customer_name or 'Guest',
-                'total': order.total_amount,
-                'status': order.status,
-                'paymentStatus': order.payment_status,
-                'date': order.created_at.strftime('%Y-%m-%d')
-            })
+        rows = db.session.execute(
+            db.select(
+                Order.order_number,
+                db.func.coalesce(Order.customer_name, 'Guest'),
+                Order.total_amount,
+                Order.status,
+                Order.payment_status,
+                db.func.date(Order.created_at)
+            ).order_by(Order.created_at.desc())
+        )
         
         return jsonify({
             'success': True,
-            'orders': order_list
+            'orders': records(('id', 'customer', 'total', 'status', 'paymentStatus', 'date'), rows)
         })
     
     except Exception as e:
         print(f"Error fetching admin orders: {str(e)}")
         return jsonify({'success': False, 'message': f'Error fetching orders: {str(e)}'})
 
-@app.route('/api/orders/<order_id>/status', methods=['PUT'])
+ADMIN_ORDER_EXPORT_HEADER = ('orderNumber', 'createdAt', 'customerName', 'customerEmail', 'customerPhone', 'total',
+                             'status', 'paymentStatus', 'paymentMethod', 'mpesaReceipt')
+SELLER_ORDER_EXPORT_HEADER = ('orderNumber', 'createdAt', 'customerName', 'status', 'paymentStatus',
+                              'productId', 'productName', 'quantity', 'unitPrice', 'totalPrice')
+
+@api.route('/api/orders/admin/export', methods=['GET'])
+@read_replica
+def export_admin_orders():
+    """Stream every order as CSV or NDJSON (?format=csv|ndjson)"""
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    
+    statement = db.select(
+        Order.order_number, Order.created_at, Order.customer_name, Order.customer_email, Order.customer_phone,
+        Order.total_amount, Order.status, Order.payment_status, Order.payment_method, Order.mpesa_receipt_number
+    ).order_by(Order.order_id.desc())
+    return export_response(statement, ADMIN_ORDER_EXPORT_HEADER, export_format, 'orders')
+
+@api.route('/api/orders/seller/export', methods=['GET'])
+@read_replica
+def export_seller_orders():
+    """Stream the seller's order lines as CSV or NDJSON (?format=csv|ndjson)"""
+    auth_check = check_seller_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Seller not authenticated'})
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    
+    statement = (
+        db.select(
+            Order.order_number, Order.created_at, db.func.coalesce(Order.customer_name, 'Guest'), Order.status,
+            Order.payment_status, Product.product_id, Product.name, OrderItem.quantity, OrderItem.unit_price,
+            OrderItem.total_price
+        )
+        .join(OrderItem, OrderItem.order_id == Order.order_id)
+        .join(Product, Product.product_id == OrderItem.product_id)
+        .where(Product.seller_id == auth_data.get('seller_id'))
+        .order_by(Order.order_id.desc(), OrderItem.item_id)
+    )
+    return export_response(statement, SELLER_ORDER_EXPORT_HEADER, export_format, 'seller-orders')
+
+@api.route('/api/orders/<order_id>/status', methods=['PUT'])
 def update_order_status(order_id):
     """Update order status (seller/admin only)"""
     try:
@@ -988,5 +1565,279 @@ def update_order_status(order_id):
         print(f"Error updating order status: {str(e)}")
         return jsonify({'success': False, 'message': f'Error updating order status: {str(e)}'})
 
+@api.route('/api/mpesa/reconcile/metrics', methods=['GET'])
+def get_reconcile_metrics():
+    """Reconciliation lag and throughput for missed M-Pesa callbacks"""
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    return jsonify({
+        'success': True,
+        'metrics': reconciler.metrics()
+    })
+
+ADMIN_USERS_PAGE_SIZE = 50
+ADMIN_USERS_MAX_PAGE_SIZE = 200
+ADMIN_USER_KEYS = ('user_id', 'username', 'email', 'phone_number', 'created_at')
+ADMIN_SELLER_KEYS = ('seller_id', 'username', 'email', 'business_name', 'approval_status', 'phone_number', 'created_at')
+
+def admin_directory_page(id_column, columns, keys, search, cursor, limit):
+    """One keyset page (newest first) of users or sellers whose email or username starts with `search`"""
+    query = db.select(*columns)
+    if search:
+        model = id_column.class_
+        query = query.where(db.or_(
+            model.email.startswith(search, autoescape=True),
+            model.username.startswith(search, autoescape=True)
+        ))
+    if cursor:
+        query = query.where(id_column < cursor)
+    rows = db.session.execute(query.order_by(id_column.desc()).limit(limit + 1)).all()
+    page = records(keys, rows[:limit])
+    return page, (page[-1][keys[0]] if len(rows) > limit else None)
+
+@api.route('/api/admin/users', methods=['GET'])
+@read_replica
+def get_admin_users():
+    """Buyers (with order count and paid spend) and sellers for the admin directory.
+    
+    Both lists are keyset-paginated newest first: pass `nextCursor` back as
+    `?cursor=` for more buyers and `nextSellerCursor` as `?sellerCursor=` for
+    more sellers; `?only=users|sellers` skips the other list. `?q=` matches
+    the start of the email or username.
+    """
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    try:
+        limit = min(max(request.args.get('limit', ADMIN_USERS_PAGE_SIZE, type=int), 1), ADMIN_USERS_MAX_PAGE_SIZE)
+        search = request.args.get('q', '').strip()
+        only = request.args.get('only')
+        response = {'success': True}
+        
+        if only != 'sellers':
+            users, response['nextCursor'] = admin_directory_page(
+                User.user_id, [getattr(User, key) for key in ADMIN_USER_KEYS], ADMIN_USER_KEYS,
+                search, request.args.get('cursor', type=int), limit
+            )
+            # Aggregates for this page only, in one grouped query (covered by ix_orders_user_payment_total)
+            stats = {}
+            if users:
+                stats = {user_id: (count, spent) for user_id, count, spent in db.session.execute(
+                    db.select(
+                        Order.user_id,
+                        db.func.count(),
+                        db.func.coalesce(db.func.sum(
+                            case((Order.payment_status == 'completed', Order.total_amount), else_=0)
+                        ), 0)
+                    ).where(Order.user_id.in_([user['user_id'] for user in users])).group_by(Order.user_id)
+                )}
+            for user in users:
+                user['order_count'], user['total_spent'] = stats.get(user['user_id'], (0, 0))
+            response['users'] = users
+        
+        if only != 'users':
+            response['sellers'], response['nextSellerCursor'] = admin_directory_page(
+                SellerProfile.seller_id, [getattr(SellerProfile, key) for key in ADMIN_SELLER_KEYS], ADMIN_SELLER_KEYS,
+                search, request.args.get('sellerCursor', type=int), limit
+            )
+        
+        return jsonify(response)
+    
+    except Exception as e:
+        print(f"Error fetching users: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error fetching users: {str(e)}'})
+
+SELLER_QUEUE_KEYS = ('seller_id', 'username', 'email', 'business_name', 'business_description', 'approval_status',
+                     'phone_number', 'created_at', 'approved_at')
+SELLER_DECISIONS_LIMIT = 1000
+
+@api.route('/api/admin/sellers', methods=['GET'])
+def get_seller_queue():
+    """Sellers in one approval status (default pending), oldest first, with per-status counts.
+    
+    Pass the returned `nextCursor` as `?cursor=` for the next page.
+    """
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    try:
+        status = request.args.get('status', 'pending')
+        if status not in SELLER_STATUSES:
+            return jsonify({'success': False, 'message': f"status must be one of {', '.join(SELLER_STATUSES)}"})
+        limit = min(max(request.args.get('limit', ADMIN_USERS_PAGE_SIZE, type=int), 1), ADMIN_USERS_MAX_PAGE_SIZE)
+        
+        # Keyset over ix_seller_profile_approval_created
+        query = db.select(*[getattr(SellerProfile, key) for key in SELLER_QUEUE_KEYS]).where(
+            SellerProfile.approval_status == status
+        )
+        cursor = request.args.get('cursor')
+        if cursor:
+            created_at, seller_id = decode_message_cursor(cursor)
+            query = query.where(db.or_(
+                SellerProfile.created_at > created_at,
+                db.and_(SellerProfile.created_at == created_at, SellerProfile.seller_id > seller_id)
+            ))
+        rows = db.session.execute(
+            query.order_by(SellerProfile.created_at, SellerProfile.seller_id).limit(limit + 1)
+        ).all()
+        sellers = records(SELLER_QUEUE_KEYS, rows[:limit])
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = f"{sellers[-1]['created_at'].isoformat()}_{sellers[-1]['seller_id']}"
+        
+        return jsonify({
+            'success': True,
+            'sellers': sellers,
+            'nextCursor': next_cursor,
+            'counts': seller_status_counts.get()
+        })
+    
+    except Exception as e:
+        print(f"Error fetching seller queue: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error fetching sellers: {str(e)}'})
+
+@api.route('/api/admin/sellers/decisions', methods=['POST'])
+def decide_seller_approvals():
+    """Approve or reject many sellers at once: {sellerIds: [...], decision: 'approved'|'rejected'}"""
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    try:
+        data = request.json or {}
+        decision = data.get('decision')
+        if decision not in SELLER_DECISIONS:
+            return jsonify({'success': False, 'message': 'decision must be approved or rejected'})
+        seller_ids = [int(seller_id) for seller_id in data.get('sellerIds') or []]
+        if not seller_ids:
+            return jsonify({'success': False, 'message': 'Provide sellerIds'})
+        if len(seller_ids) > SELLER_DECISIONS_LIMIT:
+            return jsonify({'success': False, 'message': f'At most {SELLER_DECISIONS_LIMIT} sellers can be decided at once'})
+        
+        # Seller auth reads approval_status from the database on every request, so
+        # there's no auth cache to drop; only the status counts need the change
+        as_of = time.monotonic()
+        updated, changes = decide_sellers(seller_ids, decision)
+        seller_status_counts.adjust(changes, as_of)
+        
+        return jsonify({
+            'success': True,
+            'message': f'{updated} sellers {decision}',
+            'updated': updated,
+            'counts': seller_status_counts.get()
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error deciding sellers: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error updating sellers: {str(e)}'})
+
+@api.route('/api/admin/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """Slow SQL statements grouped by fingerprint, with the routes that ran them and their EXPLAIN plans"""
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    if request.args.get('reset') == 'true':
+        slow_query_log.reset()
+        return jsonify({'success': True, 'message': 'Slow query log cleared'})
+    
+    return jsonify({
+        'success': True,
+        'enabled': slow_query_log.enabled,
+        'thresholdMs': current_app.config['SLOW_QUERY_THRESHOLD_MS'],
+        'queries': slow_query_log.report()
+    })
+
+@api.route('/api/admin/jobs', methods=['GET'])
+def get_jobs():
+    """Background job counts per queue and status, plus the most recent failures"""
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    failed = db.session.query(
+        Job.job_id, Job.queue, Job.name, Job.attempts, Job.last_error, Job.finished_at
+    ).filter(Job.status == 'failed').order_by(Job.finished_at.desc()).limit(20)
+    
+    return jsonify({
+        'success': True,
+        'queues': job_runner.stats(),
+        'recentFailures': records(('id', 'queue', 'name', 'attempts', 'error', 'failedAt'), failed)
+    })
+
+@api.route('/api/admin/profiles', methods=['GET'])
+def get_profiles():
+    """List captured request profiles, newest first"""
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    return jsonify({
+        'success': True,
+        'profiles': list(reversed(request_profiler.profiles()))
+    })
+
+@api.route('/api/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    """Download one profile (.prof for pstats, .collapsed for flame graphs)"""
+    auth_check = check_admin_auth()
+    auth_data = auth_check.get_json()
+    
+    if not auth_data.get('isAuthenticated'):
+        return jsonify({'success': False, 'message': 'Admin not authenticated'})
+    
+    if name not in request_profiler.profiles():
+        return jsonify({'success': False, 'message': 'Profile not found'}), 404
+    
+    return send_from_directory(request_profiler.directory, name, as_attachment=True)
+
+@api.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness/readiness probe reporting database round-trip latency"""
+    if current_app.extensions.get('draining'):
+        return jsonify({'status': 'draining'}), 503
+    
+    try:
+        started = time.perf_counter()
+        db.session.execute(db.text('SELECT 1'))
+        latency_ms = (time.perf_counter() - started) * 1000
+        
+        return jsonify({
+            'status': 'ok',
+            'database': {'status': 'ok', 'latencyMs': round(latency_ms, 2)}
+        })
+    
+    except Exception as e:
+        print(f"Health check failed: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'database': {'status': 'error', 'message': str(e)}
+        }), 503
+
 if __name__ == '__main__':
+    # Development server; use gunicorn with gunicorn.conf.py in production
+    app = create_app()
+    # The debug reloader imports this module twice; only start the workers in the serving process
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers(app)
     app.run(debug=True)
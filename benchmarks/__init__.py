@@ -0,0 +1 @@
+"""Endpoint benchmarks over a seeded SQLite database; run with `python -m benchmarks.run --help`"""
@@ -0,0 +1,187 @@
+"""One benchmark case per API route.
+
+Each case names the endpoint it covers so the runner can report routes
+that have no case. `request(ctx, i)` returns the keyword arguments for the
+test client call; `prepare(ctx, i)` runs untimed before each call, e.g. to
+create the row a DELETE removes.
+"""
+from models import db, Product, Message
+from benchmarks.seed import PASSWORD, USER_EMAIL, SELLER_EMAIL, ADMIN_EMAIL
+from datetime import datetime
+import io
+
+class Case:
+    def __init__(self, name, endpoint, method, path, role=None, request=None, prepare=None,
+                 statuses=(200,), check_success=True, first_chunk=False):
+        self.name = name
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.role = role
+        self.request = request or (lambda ctx, i: {})
+        self.prepare = prepare
+        self.statuses = statuses
+        self.check_success = check_success
+        # Streaming responses are timed to their first chunk
+        self.first_chunk = first_chunk
+
+    def path_for(self, ctx, i):
+        return self.path(ctx, i) if callable(self.path) else self.path
+
+def insert_product(ctx, i):
+    with ctx.app.app_context():
+        product = Product(name=f'Bench temp {i}', description='temp', price=10, stock=1,
+                          category='Eggs', seller_id=ctx.seller_id)
+        db.session.add(product)
+        db.session.commit()
+        return product.product_id
+
+def insert_messages(ctx, count):
+    with ctx.app.app_context():
+        result = db.session.execute(Message.__table__.insert().returning(Message.message_id), [
+            {'content': 'bench temp', 'seller_id': ctx.seller_id, 'is_read': True, 'created_at': datetime.utcnow()}
+            for _ in range(count)
+        ])
+        ids = [row[0] for row in result]
+        db.session.commit()
+        return ids
+
+def import_csv(i, rows):
+    lines = ['name,description,price,stock,category']
+    lines += [f'Bench import {i}-{n},Imported in bulk,{100 + n},{n % 50},Chicks' for n in range(rows)]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def checkout_request_id(i):
+    # Matches the generated orders (see generate_data.py)
+    return f'ws_CO_GEN{i % 1000 + 1:010d}'
+
+def stk_callback(i):
+    return {'Body': {'stkCallback': {
+        'MerchantRequestID': f'bench-{i}', 'CheckoutRequestID': checkout_request_id(i),
+        'ResultCode': 0, 'ResultDesc': 'The service request is processed successfully.',
+        'CallbackMetadata': {'Item': [{'Name': 'MpesaReceiptNumber', 'Value': f'BENCH{i}'}]}
+    }}}
+
+def order_payload(ctx, i):
+    product_id = ctx.product_id(i)
+    return {'json': {
+        'customerName': 'Bench Buyer', 'customerEmail': USER_EMAIL, 'customerPhone': '254700000000',
+        'totalAmount': 200, 'paymentMethod': 'mpesa', 'checkoutRequestId': f'ws_CO_bench_new_{i}',
+        'items': [{'productId': product_id, 'quantity': 2, 'unitPrice': 100, 'totalPrice': 200}]
+    }}
+
+CASES = [
+    # Health and diagnostics
+    Case('healthz', 'api.healthz', 'GET', '/healthz'),
+    Case('metrics', 'prometheus_metrics', 'GET', '/metrics', check_success=False),
+    Case('reconcile_metrics', 'api.get_reconcile_metrics', 'GET', '/api/mpesa/reconcile/metrics', role='admin'),
+    Case('slow_queries', 'api.get_slow_queries', 'GET', '/api/admin/slow-queries', role='admin'),
+    Case('jobs', 'api.get_jobs', 'GET', '/api/admin/jobs', role='admin'),
+    Case('admin_users', 'api.get_admin_users', 'GET', '/api/admin/users', role='admin'),
+    Case('seller_queue', 'api.get_seller_queue', 'GET', '/api/admin/sellers', role='admin'),
+    Case('seller_decisions', 'api.decide_seller_approvals', 'POST', '/api/admin/sellers/decisions', role='admin',
+         request=lambda ctx, i: {'json': {
+             'sellerIds': [n % ctx.counts.get('sellers', 2) + 1 for n in range(i, i + 20)],
+             'decision': ('approved', 'rejected')[i % 2]}}),
+    Case('admin_users_search', 'api.get_admin_users', 'GET', '/api/admin/users?q=user1&only=users', role='admin'),
+    Case('profiles', 'api.get_profiles', 'GET', '/api/admin/profiles', role='admin'),
+    Case('download_profile', 'api.download_profile', 'GET',
+         lambda ctx, i: f'/api/admin/profiles/{ctx.profile_name}', role='admin', check_success=False),
+
+    # Accounts
+    Case('register', 'api.register', 'POST', '/api/register', request=lambda ctx, i: {'json': {
+        'username': f'bench{i}', 'email': f'bench-{ctx.run_id}-{i}@example.com', 'password': PASSWORD}}),
+    Case('login', 'api.login', 'POST', '/api/login',
+         request=lambda ctx, i: {'json': {'email': USER_EMAIL, 'password': PASSWORD}}),
+    Case('check_auth', 'api.check_auth', 'GET', '/api/check-auth', role='user', check_success=False),
+    Case('logout', 'api.logout', 'POST', '/api/logout'),
+    Case('seller_register', 'api.seller_register', 'POST', '/api/seller/register', request=lambda ctx, i: {'json': {
+        'username': f'bench{i}', 'email': f'bench-seller-{ctx.run_id}-{i}@example.com', 'password': PASSWORD,
+        'business_name': f'Bench Farm {i}'}}),
+    Case('seller_login', 'api.seller_login', 'POST', '/api/seller/login',
+         request=lambda ctx, i: {'json': {'email': SELLER_EMAIL, 'password': PASSWORD}}),
+    Case('seller_check_auth', 'api.seller_auth_check', 'GET', '/api/seller/check-auth', role='seller',
+         check_success=False),
+    Case('seller_update_profile', 'api.update_seller_profile', 'PUT', '/api/seller/update-profile', role='seller',
+         request=lambda ctx, i: {'json': {'business_description': f'Updated {i}'}}),
+    Case('admin_login', 'api.admin_login', 'POST', '/api/admin/login',
+         request=lambda ctx, i: {'json': {'email': ADMIN_EMAIL, 'password': PASSWORD}}),
+    Case('admin_check_auth', 'api.admin_auth_check', 'GET', '/api/admin/check-auth', role='admin',
+         check_success=False),
+    Case('admin_update_profile', 'api.update_admin_profile', 'PUT', '/api/admin/update-profile', role='admin',
+         request=lambda ctx, i: {'json': {'department': f'Ops {i}'}}),
+
+    # Catalog
+    Case('get_products', 'api.get_products', 'GET', '/api/products'),
+    Case('get_products_uncached', 'api.get_products', 'GET', '/api/products',
+         prepare=lambda ctx, i: ctx.app.extensions['catalog_cache'].invalidate()),
+    Case('product_facets', 'api.get_product_facets', 'GET', '/api/products/facets'),
+    Case('related_products', 'api.get_related_products', 'GET',
+         lambda ctx, i: f'/api/products/{ctx.product_id(i)}/related'),
+    Case('get_product', 'api.get_product', 'GET', lambda ctx, i: f'/api/products/{ctx.product_id(i)}'),
+    Case('get_seller_products', 'api.get_seller_products', 'GET', '/api/seller/products', role='seller'),
+    Case('add_product', 'api.add_product', 'POST', '/api/products/create', role='seller',
+         request=lambda ctx, i: {'json': {'name': f'Bench {i}', 'description': 'Benchmark product',
+                                          'price': 120, 'stock': 10, 'category': 'Eggs'}}),
+    Case('import_products', 'api.bulk_import_products', 'POST', '/api/products/import', role='seller',
+         request=lambda ctx, i: {'data': import_csv(i, 100), 'content_type': 'text/csv'}),
+    Case('update_product', 'api.update_product', 'PUT',
+         lambda ctx, i: f'/api/products/{ctx.seller_product_id(i)}', role='seller',
+         request=lambda ctx, i: {'json': {'stock': i % 100}}),
+    Case('bulk_update_products', 'api.bulk_update_products', 'PUT', '/api/seller/products', role='seller',
+         request=lambda ctx, i: {'json': {'updates': [
+             {'productId': ctx.seller_product_id(i + n), 'price': 100 + n, 'stock': i % 100} for n in range(100)
+         ]}}),
+    Case('delete_product', 'api.delete_product', 'DELETE',
+         lambda ctx, i: f'/api/products/{ctx.prepared}', role='seller', prepare=insert_product),
+    Case('admin_delete_product', 'api.admin_delete_product', 'DELETE',
+         lambda ctx, i: f'/api/admin/products/{ctx.prepared}', role='admin', prepare=insert_product),
+    Case('upload_product_image', 'api.upload_product_image', 'POST', '/api/upload/product-image', role='seller',
+         request=lambda ctx, i: {'data': {'image': (io.BytesIO(b'\x89PNG\r\n\x1a\n' + b'\0' * 2048), f'bench{i}.png')},
+                                 'content_type': 'multipart/form-data'}),
+
+    # Messages
+    Case('send_message', 'api.send_message', 'POST', '/api/messages/send', request=lambda ctx, i: {'json': {
+        'sellerId': ctx.seller_id, 'content': f'Benchmark enquiry {i}', 'senderName': 'Bench',
+        'senderEmail': f'sender{i}@example.com', 'productName': 'Eggs'}}),
+    Case('get_seller_messages', 'api.get_seller_messages', 'GET', '/api/seller/messages', role='seller'),
+    Case('seller_message_count', 'api.get_seller_message_count', 'GET', '/api/seller/messages/count',
+         role='seller'),
+    Case('search_seller_messages', 'api.search_seller_messages', 'GET',
+         '/api/seller/messages/search?q=available', role='seller'),
+    Case('mark_message_read', 'api.mark_message_read', 'PUT',
+         lambda ctx, i: f'/api/seller/messages/mark-read/{ctx.seller_message_id(i)}', role='seller'),
+    Case('bulk_mark_read', 'api.bulk_mark_messages_read', 'PUT', '/api/seller/messages/mark-read', role='seller',
+         request=lambda ctx, i: {'json': {'messageIds': ctx.seller_message_ids(i, 50)}}),
+    Case('bulk_delete_messages', 'api.bulk_delete_messages', 'DELETE', '/api/seller/messages', role='seller',
+         prepare=lambda ctx, i: insert_messages(ctx, 50),
+         request=lambda ctx, i: {'json': {'messageIds': ctx.prepared}}),
+    Case('seller_events', 'api.seller_events', 'GET', '/api/seller/events', role='seller',
+         check_success=False, first_chunk=True),
+
+    # Orders
+    Case('create_order', 'api.create_order', 'POST', '/api/orders/create', role='user', request=order_payload),
+    Case('update_order_payment', 'api.update_order_payment', 'PUT', '/api/orders/update-payment',
+         request=lambda ctx, i: {'json': {'checkoutRequestId': checkout_request_id(i),
+                                          'paymentStatus': 'completed', 'receiptNumber': f'BENCH{i}'}}),
+    Case('update_order_status', 'api.update_order_status', 'PUT',
+         lambda ctx, i: f'/api/orders/GEN{i % 1000 + 1:010d}/status', role='admin',
+         request=lambda ctx, i: {'json': {'status': 'dispatched'}}),
+    Case('get_user_orders', 'api.get_user_orders', 'GET', '/api/orders/user', role='user'),
+    Case('get_seller_orders', 'api.get_seller_orders', 'GET', '/api/orders/seller', role='seller'),
+    Case('get_admin_orders', 'api.get_admin_orders', 'GET', '/api/orders/admin', role='admin'),
+    Case('export_admin_orders', 'api.export_admin_orders', 'GET', '/api/orders/admin/export?format=csv',
+         role='admin', check_success=False),
+    Case('export_seller_orders', 'api.export_seller_orders', 'GET', '/api/orders/seller/export?format=ndjson',
+         role='seller', check_success=False),
+
+    # M-Pesa (Daraja is stubbed by the runner)
+    Case('stk_push', 'mpesa.initiate_stk_push', 'POST', '/api/mpesa/stkpush',
+         request=lambda ctx, i: {'json': {'phoneNumber': '254700000000', 'amount': 1}}),
+    Case('payment_status', 'mpesa.check_payment_status', 'GET', lambda ctx, i: f'/api/mpesa/status/{ctx.checkout_id}'),
+    Case('mpesa_callback', 'mpesa.mpesa_callback', 'POST', '/api/mpesa/callback',
+         request=lambda ctx, i: {'json': stk_callback(i)}, check_success=False),
+]
+
+# Routes deliberately left out
+SKIPPED_ENDPOINTS = {'static'}
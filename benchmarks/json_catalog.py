@@ -0,0 +1,51 @@
+"""Micro-benchmark for building and serializing the /api/products catalog payload.
+
+    python -m benchmarks.json_catalog --products 100000
+
+Compares Flask's standard-library JSON provider with FastJSONProvider on
+the same payload, and times building the payload from the database.
+"""
+import argparse
+import os
+import time
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time catalog payload building and JSON serialization')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5, help='report the best of this many runs')
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = 'sqlite://'
+    from flask.json.provider import DefaultJSONProvider
+    from app import build_catalog, create_app
+    from generate_data import generate
+    from json_provider import orjson
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        generate(db.engine, users=0, sellers=max(args.products // 100, 1), products=args.products,
+                 orders=0, messages=0, progress=False)
+
+        build_ms, payload = best_of(args.repeat, build_catalog)
+        stdlib = DefaultJSONProvider(app)
+        stdlib_ms, stdlib_body = best_of(args.repeat, lambda: stdlib.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        fast_ms, fast_body = best_of(args.repeat, lambda: app.json.dumps_bytes(payload))
+
+    print(f"catalog of {args.products} products, {len(fast_body) / 1e6:.1f} MB")
+    print(f"{'build from database':<34}{build_ms:10.1f} ms")
+    print(f"{'stdlib json provider':<34}{stdlib_ms:10.1f} ms")
+    fast_label = f"FastJSONProvider ({'orjson' if orjson else 'stdlib fallback'})"
+    print(f"{fast_label:<34}{fast_ms:10.1f} ms  ({stdlib_ms / fast_ms:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Throughput of the bulk product import against one product per request.
+
+    python -m benchmarks.product_import --rows 50000
+
+Imports the same generated rows as CSV and as JSON lines through
+/api/products/import, and times --single of them posted one at a time to
+/api/products/create, all on an in-memory SQLite database.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+
+def product_rows(count):
+    for n in range(count):
+        yield {'name': f'Imported hen {n}', 'description': 'Kienyeji hen, vaccinated', 'price': 600 + n % 900,
+               'stock': n % 40, 'category': 'Chicken'}
+
+def csv_body(count):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, ['name', 'description', 'price', 'stock', 'category'])
+    writer.writeheader()
+    writer.writerows(product_rows(count))
+    return buffer.getvalue().encode('utf-8')
+
+def jsonl_body(count):
+    return ''.join(json.dumps(row) + '\n' for row in product_rows(count)).encode('utf-8')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare bulk product import with single-product requests')
+    parser.add_argument('--rows', type=int, default=50000, help='rows per bulk import')
+    parser.add_argument('--single', type=int, default=1000, help='products to create one request at a time')
+    parser.add_argument('--batch-size', type=int, help='rows per INSERT (default IMPORT_BATCH_SIZE)')
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = 'sqlite://'
+    from app import create_app
+    from config import Config
+    from models import db
+    from benchmarks.seed import SELLER_EMAIL, PASSWORD
+    from generate_data import generate
+
+    config = Config()
+    config.RATE_LIMIT_ENABLED = False
+    config.IMPORT_MAX_ROWS = max(args.rows, config.IMPORT_MAX_ROWS)
+    if args.batch_size:
+        config.IMPORT_BATCH_SIZE = args.batch_size
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        # Seller 1 is the benchmark seller (SELLER_EMAIL / PASSWORD)
+        generate(db.engine, users=0, sellers=1, products=0, orders=0, messages=0, progress=False)
+
+    client = app.test_client()
+    client.post('/api/seller/login', json={'email': SELLER_EMAIL, 'password': PASSWORD})
+
+    print(f"{'method':<34}{'rows':>8}{'seconds':>10}{'rows/s':>12}")
+    for label, body, content_type in (('bulk import, CSV', csv_body(args.rows), 'text/csv'),
+                                      ('bulk import, JSON lines', jsonl_body(args.rows), 'application/x-ndjson')):
+        started = time.perf_counter()
+        result = client.post('/api/products/import', data=body, content_type=content_type).get_json()
+        elapsed = time.perf_counter() - started
+        if not result.get('success') or result['failed']:
+            raise SystemExit(f"{label} failed: {result.get('message')}")
+        print(f"{label:<34}{result['imported']:>8}{elapsed:>10.2f}{result['imported'] / elapsed:>12,.0f}")
+
+    started = time.perf_counter()
+    for row in product_rows(args.single):
+        client.post('/api/products/create', json=row)
+    elapsed = time.perf_counter() - started
+    print(f"{'one product per request':<34}{args.single:>8}{elapsed:>10.2f}{args.single / elapsed:>12,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+"""Benchmark every API route against a seeded SQLite database.
+
+    python -m benchmarks.run --size 1k                  # compare with benchmarks/baselines/1k.json
+    python -m benchmarks.run --size 1k --save-baseline  # record a new baseline
+    python -m benchmarks.run --size 100k --db /tmp/bench-100k.db --only orders
+
+Exits with status 1 when a case's p95 latency or throughput regresses past
+--threshold relative to the baseline. Daraja calls are stubbed, so M-Pesa
+routes measure only our own overhead.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Flask API over a seeded SQLite database')
+    parser.add_argument('--size', default='1k', help='seed size: 1k, 100k or 1m (default 1k)')
+    parser.add_argument('--db', help='SQLite file to seed or reuse (default: a fresh temporary file)')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per case')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per case')
+    parser.add_argument('--max-seconds', type=float, default=10.0, help='time budget per case')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads (not with --db :memory:)')
+    parser.add_argument('--only', help='regex; run only cases whose name matches')
+    parser.add_argument('--daraja-latency', type=float, default=0.0, help='seconds each stubbed Daraja call takes')
+    parser.add_argument('--baseline', help='baseline JSON (default benchmarks/baselines/<size>.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='write results as the new baseline')
+    parser.add_argument('--output', help='also write results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative regression (default 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='ignore p95 regressions smaller than this')
+    return parser.parse_args(argv)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+class StubResponse:
+    def __init__(self, payload):
+        self.status_code = 200
+        self._payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+def stub_daraja(latency):
+    """Replace outbound Daraja calls with canned successful responses"""
+    import requests
+    from routes import mpesa
+
+    def fake_request(method, url, **kwargs):
+        if latency:
+            time.sleep(latency)
+        if mpesa.AUTH_ENDPOINT in url:
+            return StubResponse({'access_token': 'bench-token', 'expires_in': '3599'})
+        if mpesa.STK_QUERY_ENDPOINT in url:
+            return StubResponse({'ResponseCode': '0', 'ResultCode': '0', 'ResultDesc': 'ok'})
+        return StubResponse({'ResponseCode': '0', 'CheckoutRequestID': f'ws_CO_{uuid.uuid4().hex[:12]}',
+                             'MerchantRequestID': 'bench', 'CustomerMessage': 'Success'})
+
+    class StubRequests:
+        exceptions = requests.exceptions
+        request = staticmethod(fake_request)
+
+    mpesa.requests = StubRequests
+    mpesa.check_internet_connection = lambda: True
+    mpesa.is_mpesa_api_reachable = lambda: True
+
+class Context:
+    """Shared state the cases draw ids and accounts from"""
+
+    def __init__(self, app, counts):
+        self.app = app
+        self.counts = counts
+        self.run_id = uuid.uuid4().hex[:8]
+        self._local = threading.local()
+
+    @property
+    def prepared(self):
+        return self._local.prepared
+
+    @prepared.setter
+    def prepared(self, value):
+        self._local.prepared = value
+
+    def product_id(self, i):
+        return i % self.counts['products'] + 1
+
+    def seller_product_id(self, i):
+        return self.seller_product_ids[i % len(self.seller_product_ids)]
+
+    def seller_message_id(self, i):
+        return self.seller_message_ids_all[i % len(self.seller_message_ids_all)]
+
+    def seller_message_ids(self, i, count):
+        ids = self.seller_message_ids_all
+        start = (i * count) % len(ids)
+        return (ids[start:] + ids[:start])[:count]
+
+def build_app(args):
+    # Settings are read from the environment when the app is created. In-memory SQLite shares one
+    # connection between the request threads and the background writers, so default to a file.
+    if args.db is None:
+        directory = tempfile.mkdtemp(prefix='bench-db-')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        args.db = os.path.join(directory, 'bench.db')
+    if args.db == ':memory:':
+        os.environ['DATABASE_URL'] = 'sqlite://'
+    else:
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+    os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='bench-uploads-'))
+    os.environ.setdefault('PROFILE_DIR', tempfile.mkdtemp(prefix='bench-profiles-'))
+
+    from app import create_app
+    from config import Config
+
+    config = Config()
+    # Benchmarks hammer the same accounts; don't let the rate limiter answer 429
+    config.RATE_LIMIT_ENABLED = False
+    spool_dir = tempfile.mkdtemp(prefix='bench-spool-')
+    config.MESSAGE_SPOOL_PATH = os.path.join(spool_dir, 'spool.jsonl')
+    config.MPESA_CALLBACK_SPOOL_PATH = os.path.join(spool_dir, 'callbacks.jsonl')
+    return create_app(config)
+
+def prepare_database(app, args):
+    from models import db, Product, SellerProfile, Message
+    from benchmarks.seed import SIZES, SELLER_EMAIL, seed
+
+    rows = SIZES.get(args.size.lower())
+    if rows is None:
+        sys.exit(f"Unknown size {args.size}; choose from {', '.join(SIZES)}")
+
+    with app.app_context():
+        db.create_all()
+        existing = db.session.query(Product).count()
+        if existing == 0:
+            counts = seed(rows)
+        elif existing < rows:
+            sys.exit(f"{args.db} holds {existing} products, fewer than size {args.size}; use a fresh file")
+        else:
+            print(f"Reusing seeded database {args.db}")
+            counts = {'products': rows}
+
+        ctx = Context(app, counts)
+        seller = SellerProfile.query.filter_by(email=SELLER_EMAIL).first()
+        ctx.seller_id = seller.seller_id
+        ctx.seller_product_ids = [row[0] for row in db.session.query(Product.product_id).filter_by(seller_id=seller.seller_id).limit(1000)]
+        ctx.seller_message_ids_all = [row[0] for row in db.session.query(Message.message_id).filter_by(seller_id=seller.seller_id).limit(1000)]
+        if not ctx.seller_product_ids or not ctx.seller_message_ids_all:
+            sys.exit('The benchmark seller owns no products or messages; reseed with a larger size')
+        return ctx
+
+class Clients:
+    """One logged-in test client per role and thread"""
+
+    def __init__(self, app):
+        from benchmarks.seed import PASSWORD, USER_EMAIL, SELLER_EMAIL, ADMIN_EMAIL
+
+        self.app = app
+        self.logins = {
+            'user': ('/api/login', USER_EMAIL),
+            'seller': ('/api/seller/login', SELLER_EMAIL),
+            'admin': ('/api/admin/login', ADMIN_EMAIL),
+        }
+        self.password = PASSWORD
+        self._local = threading.local()
+
+    def get(self, role):
+        clients = getattr(self._local, 'clients', None)
+        if clients is None:
+            clients = self._local.clients = {}
+        if role not in clients:
+            client = self.app.test_client()
+            if role is not None:
+                path, email = self.logins[role]
+                response = client.post(path, json={'email': email, 'password': self.password})
+                if not response.get_json().get('success'):
+                    raise RuntimeError(f"Benchmark {role} login failed: {response.get_json()}")
+            clients[role] = client
+        return clients[role]
+
+def call(case, ctx, clients, i):
+    """Run one request; returns (seconds, error message or None)"""
+    if case.prepare:
+        ctx.prepared = case.prepare(ctx, i)
+    client = clients.get(case.role)
+    kwargs = case.request(ctx, i)
+    path = case.path_for(ctx, i)
+
+    started = time.perf_counter()
+    if case.first_chunk:
+        response = client.open(path, method=case.method, buffered=False, **kwargs)
+        next(response.response)
+        elapsed = time.perf_counter() - started
+        response.close()
+        return elapsed, None if response.status_code in case.statuses else f"status {response.status_code}"
+    response = client.open(path, method=case.method, **kwargs)
+    elapsed = time.perf_counter() - started
+
+    if response.status_code not in case.statuses:
+        return elapsed, f"status {response.status_code}: {response.get_data(as_text=True)[:200]}"
+    if case.check_success and response.is_json and response.get_json().get('success') is False:
+        return elapsed, response.get_json().get('message')
+    return elapsed, None
+
+def run_case(case, ctx, clients, args):
+    for i in range(args.warmup):
+        call(case, ctx, clients, i)
+
+    timings, errors = [], []
+    deadline = time.perf_counter() + args.max_seconds
+    counter = iter(range(args.warmup, args.warmup + args.requests))
+    lock = threading.Lock()
+
+    def worker():
+        while time.perf_counter() < deadline:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            elapsed, error = call(case, ctx, clients, i)
+            with lock:
+                timings.append(elapsed)
+                if error:
+                    errors.append(error)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(args.concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        'requests': len(timings),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'mean_ms': sum(timings) / len(timings) * 1000 if timings else 0.0,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'rps': len(timings) / wall if wall else 0.0,
+    }
+
+def compare(results, baseline, args):
+    """Return a list of regression descriptions"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('cases', {}).get(name)
+        if not previous:
+            continue
+        p95_limit = previous['p95_ms'] * (1 + args.threshold)
+        if current['p95_ms'] > p95_limit and current['p95_ms'] - previous['p95_ms'] > args.min_delta_ms:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.2f} ms vs baseline {previous['p95_ms']:.2f} ms")
+        if previous['rps'] and current['rps'] < previous['rps'] * (1 - args.threshold) \
+                and current['p95_ms'] - previous['p95_ms'] > args.min_delta_ms:
+            regressions.append(f"{name}: {current['rps']:.1f} req/s vs baseline {previous['rps']:.1f} req/s")
+    return regressions
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.concurrency > 1 and args.db == ':memory:':
+        sys.exit('--concurrency needs a file --db; in-memory SQLite shares one connection')
+
+    stub_daraja(args.daraja_latency)
+    app = build_app(args)
+    ctx = prepare_database(app, args)
+    clients = Clients(app)
+
+    from benchmarks.cases import CASES, SKIPPED_ENDPOINTS
+
+    # Cases that need state created through the API first
+    clients.get('admin').get('/api/products', headers={'X-Profile': '1'})
+    with app.app_context():
+        ctx.profile_name = app.extensions['request_profiler'].profiles()[-1]
+    ctx.checkout_id = clients.get(None).post('/api/mpesa/stkpush', json={'phoneNumber': '254700000000'}).get_json()['checkoutRequestID']
+
+    covered = {case.endpoint for case in CASES}
+    missing = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                     if rule.endpoint not in covered and rule.endpoint not in SKIPPED_ENDPOINTS)
+    if missing:
+        print(f"Routes without a benchmark case: {', '.join(missing)}")
+
+    cases = [case for case in CASES if not args.only or re.search(args.only, case.name)]
+    results = {}
+    print(f"{'case':<28}{'req':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for case in cases:
+        result = results[case.name] = run_case(case, ctx, clients, args)
+        print(f"{case.name:<28}{result['requests']:>6}{result['errors']:>5}{result['p50_ms']:>10.2f}"
+              f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['rps']:>10.1f}")
+        if result['first_error']:
+            print(f"    first error: {result['first_error']}")
+
+    app.extensions['message_buffer'].stop()
+    app.extensions['mpesa_callback_writer'].stop()
+
+    report = {
+        'size': args.size,
+        'concurrency': args.concurrency,
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cases': results,
+    }
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f'{args.size.lower()}.json')
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as out:
+            json.dump(report, out, indent=2)
+        print(f"Baseline written to {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; rerun with --save-baseline to record one")
+        return 0
+    with open(baseline_path) as f:
+        regressions = compare(results, json.load(f), args)
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} against {baseline_path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
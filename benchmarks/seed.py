@@ -0,0 +1,27 @@
+"""Seeding for the benchmark database, built on generate_data.py"""
+from models import db, AdminProfile
+from generate_data import DEFAULT_PASSWORD, generate, seller_email, user_email
+from facets import rebuild_facets
+import recommendations
+from werkzeug.security import generate_password_hash
+
+# Rows of products, orders and messages per named size
+SIZES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+# Accounts the benchmark cases log in with; seller 1 is the largest generated seller
+PASSWORD = DEFAULT_PASSWORD
+USER_EMAIL = user_email(1)
+SELLER_EMAIL = seller_email(1)
+ADMIN_EMAIL = 'admin@bench.example.com'
+
+def seed(rows, seed=42):
+    """Fill an empty schema with `rows` products, orders and messages; returns row counts"""
+    db.session.add(AdminProfile(username='bench-admin', email=ADMIN_EMAIL, password_hash=generate_password_hash(PASSWORD)))
+    db.session.commit()
+    summary = generate(db.engine, users=max(rows // 10, 2), sellers=max(rows // 100, 2), products=rows,
+                       orders=rows, messages=rows, seed=seed)
+    # generate() writes products directly, so the summary tables have to catch up
+    rebuild_facets()
+    if recommendations.np is not None:
+        recommendations.build_recommendations(full=True)
+    return {entity: count for entity, (first_id, count) in summary.items()}
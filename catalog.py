@@ -0,0 +1,66 @@
+from flask import current_app
+import threading
+import time
+
+class CatalogCache:
+    """Caches the serialized public product list.
+
+    The body is rebuilt at most once per CATALOG_CACHE_TTL seconds and right
+    after any product change in this process (`invalidate`). Other worker
+    processes pick up changes when their own copy expires. Compressed
+    variants are kept next to the body and dropped with it.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 30
+        self._lock = threading.Lock()
+        self._body = None
+        self._built_at = 0
+        self._version = 0
+        # (body, {encoding: compressed bytes}) for the body they were made from
+        self._variants = (None, {})
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CATALOG_CACHE_TTL', 30)
+        self.ttl = app.config['CATALOG_CACHE_TTL']
+        app.extensions['catalog_cache'] = self
+
+    def get(self, build):
+        """Return the cached JSON body, calling `build()` for a fresh payload when stale"""
+        body = self._body
+        if body is not None and time.monotonic() - self._built_at < self.ttl:
+            return body
+
+        with self._lock:
+            # Another thread may have rebuilt it while we waited
+            if self._body is not None and time.monotonic() - self._built_at < self.ttl:
+                return self._body
+            version = self._version
+            body = current_app.json.dumps_bytes(build())
+            # Don't keep a body built from data that changed while we were building it
+            if version == self._version:
+                self._body = body
+                self._built_at = time.monotonic()
+            return body
+
+    def get_encoded(self, build, compressor):
+        """Return (body, encoding) for the current request, compressing each body at most once per encoding"""
+        body = self.get(build)
+        encoding = compressor.choose(len(body))
+        if encoding is None:
+            return body, None
+
+        source, variants = self._variants
+        if source is not body:
+            source, variants = self._variants = (body, {})
+        compressed = variants.get(encoding)
+        if compressed is None:
+            compressed = variants[encoding] = compressor.compress(body, encoding, cached=True)
+        return compressed, encoding
+
+    def invalidate(self):
+        # Deliberately lock-free so writers never wait behind a rebuild
+        self._version += 1
+        self._body = None
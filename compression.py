@@ -0,0 +1,99 @@
+from flask import request
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html', 'text/css',
+    'application/javascript'
+}
+
+def accepted_encodings(header):
+    """Parse an Accept-Encoding header into {coding: q}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+class Compressor:
+    """Compresses responses with brotli or gzip as negotiated through Accept-Encoding.
+
+    Only compressible mimetypes of at least COMPRESS_MIN_SIZE bytes are
+    compressed; streamed and file responses pass through untouched. Routes
+    that cache their body (see CatalogCache) can keep compressed variants and
+    set Content-Encoding themselves, which this leaves alone. Brotli needs the
+    optional `brotli` package.
+    """
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 5
+        self.cached_gzip_level = 9
+        self.cached_brotli_quality = 9
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
+        # Cached bodies are compressed once per rebuild, so they can afford the slower settings
+        app.config.setdefault('COMPRESS_CACHED_GZIP_LEVEL', 9)
+        app.config.setdefault('COMPRESS_CACHED_BROTLI_QUALITY', 9)
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.gzip_level = app.config['COMPRESS_GZIP_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        self.cached_gzip_level = app.config['COMPRESS_CACHED_GZIP_LEVEL']
+        self.cached_brotli_quality = app.config['COMPRESS_CACHED_BROTLI_QUALITY']
+
+        app.after_request(self._compress_response)
+        app.extensions['compressor'] = self
+
+    def choose(self, size):
+        """Encoding to use for a `size`-byte body in the current request, or None"""
+        if size < self.min_size:
+            return None
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+        wildcard = accepted.get('*', 0)
+        # Highest q wins; on a tie the earlier (smaller output) coding does
+        supported = ('br', 'gzip') if brotli is not None else ('gzip',)
+        best = max(supported, key=lambda coding: accepted.get(coding, wildcard))
+        return best if accepted.get(best, wildcard) > 0 else None
+
+    def compress(self, data, encoding, cached=False):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.cached_brotli_quality if cached else self.brotli_quality)
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=self.cached_gzip_level if cached else self.gzip_level, mtime=0)
+
+    def _compress_response(self, response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+
+        data = response.get_data()
+        encoding = self.choose(len(data))
+        if encoding is None:
+            return response
+        response.set_data(self.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
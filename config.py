@@ -0,0 +1,103 @@
+import os
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+def env_rates(name):
+    """Parse e.g. "api.get_products=100,api.get_product=20" into {'api.get_products': 100, ...}"""
+    rates = {}
+    for item in os.environ.get(name, '').split(','):
+        if '=' in item:
+            key, rate = item.split('=', 1)
+            rates[key.strip()] = int(rate)
+    return rates
+
+def engine_options(url):
+    """SQLAlchemy engine options for `url` built from the DB_* environment variables"""
+    if url.startswith('sqlite'):
+        # SQLite picks its own pool; sizing and connect timeouts do not apply
+        return {'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True)}
+
+    options = {
+        'pool_size': env_int('DB_POOL_SIZE', 10),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 20),
+        # MySQL drops idle connections after wait_timeout; recycle well before that
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 280),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+    }
+    if url.startswith('mysql'):
+        options['connect_args'] = {
+            'connect_timeout': env_int('DB_CONNECT_TIMEOUT', 10),
+            'read_timeout': env_int('DB_READ_TIMEOUT', 30),
+            'write_timeout': env_int('DB_WRITE_TIMEOUT', 30),
+        }
+    return options
+
+class Config:
+    """Settings read from the environment when the app is created"""
+
+    def __init__(self):
+        self.SECRET_KEY = os.environ.get('SECRET_KEY', 'your_secret_key')  # Change this to a secure key in production
+        self.UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
+        # Runtime lock files (one M-Pesa reconciler per host); default: the app's instance folder
+        self.LOCK_DIR = os.environ.get('LOCK_DIR')
+
+        self.SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'mysql+pymysql://root:@localhost/kukuhub')
+        self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+        self.SQLALCHEMY_ENGINE_OPTIONS = engine_options(self.SQLALCHEMY_DATABASE_URI)
+
+        # Optional read replica for read-only GET endpoints
+        replica_url = os.environ.get('DATABASE_REPLICA_URL')
+        self.SQLALCHEMY_BINDS = {}
+        if replica_url:
+            self.SQLALCHEMY_BINDS['replica'] = dict(engine_options(replica_url), url=replica_url)
+        # After a client writes, its reads stay on the primary for this many seconds
+        self.READ_YOUR_WRITES_WINDOW = env_float('READ_YOUR_WRITES_WINDOW', 5.0)
+
+        # Fan seller SSE events out across workers through Redis; required with more than one worker
+        self.EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL')
+
+        # Share rate-limit buckets across workers through Redis (default: per process)
+        self.RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL')
+        self.RATE_LIMIT_ENABLED = env_bool('RATE_LIMIT_ENABLED', True)
+        # Proxies (load balancer, nginx) in front of the app whose X-Forwarded-For/-Proto to trust
+        self.TRUSTED_PROXIES = env_int('TRUSTED_PROXIES', 0)
+
+        # Bulk product import: rows per INSERT/transaction, and the most rows one file may hold
+        self.IMPORT_BATCH_SIZE = env_int('IMPORT_BATCH_SIZE', 500)
+        self.IMPORT_MAX_ROWS = env_int('IMPORT_MAX_ROWS', 100000)
+
+        # "Frequently bought together": products kept per product, fewest shared orders to count,
+        # and how long after an order the incremental refresh runs (orders in between share it)
+        self.RECOMMEND_TOP_K = env_int('RECOMMEND_TOP_K', 10)
+        self.RECOMMEND_MIN_CO_ORDERS = env_int('RECOMMEND_MIN_CO_ORDERS', 1)
+        self.RECOMMEND_REFRESH_DELAY = env_int('RECOMMEND_REFRESH_DELAY', 300)
+        # Longest an order's transaction may stay open and still be caught by incremental refreshes
+        self.RECOMMEND_REFRESH_OVERLAP = env_int('RECOMMEND_REFRESH_OVERLAP', 300)
+
+        # Background job worker threads per queue, e.g. "default=2,notifications=1"
+        self.JOB_QUEUES = env_rates('JOB_QUEUES') or {'default': 2, 'notifications': 1}
+
+        # Log statements slower than this many milliseconds (unset = off)
+        self.SLOW_QUERY_THRESHOLD_MS = env_float('SLOW_QUERY_THRESHOLD_MS', None)
+        self.SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE')
+
+        # On-demand request profiling (see profiling.py); sample rates profile 1 in N requests per endpoint
+        self.PROFILE_SECRET = os.environ.get('PROFILE_SECRET')
+        self.PROFILE_MODE = os.environ.get('PROFILE_MODE', 'cprofile')
+        self.PROFILE_SAMPLE_RATES = env_rates('PROFILE_SAMPLE_RATES')
+        self.PROFILE_KEEP = env_int('PROFILE_KEEP', 200)
+        if os.environ.get('PROFILE_DIR'):
+            self.PROFILE_DIR = os.environ['PROFILE_DIR']
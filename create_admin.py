@@ -2,11 +2,11 @@
 from flask import Flask
 from werkzeug.security import generate_password_hash
 from models import db, AdminProfile
+from config import Config
 import sys
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+pymysql://root:@localhost/kukuhub'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.from_object(Config())
 db.init_app(app)
 
 def create_admin_user(username, email, password, role='general', department=None, phone_number=None):
@@ -0,0 +1,61 @@
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from functools import wraps
+import time
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica bind during read-only requests.
+
+    Routing only happens inside views decorated with @read_replica, only if a
+    'replica' bind is configured, and only until the session writes anything;
+    from then on the rest of the request uses the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica():
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self):
+        return (
+            has_request_context()
+            and g.get('db_read_replica', False)
+            and not g.get('db_wrote', False)
+            and 'replica' in current_app.config['SQLALCHEMY_BINDS']
+        )
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+
+@event.listens_for(RoutingSession, 'before_flush')
+def pin_on_flush(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        _mark_write()
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def pin_on_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+def init_routing(app):
+    """Remember which clients just wrote so their next reads skip the replica"""
+
+    @app.after_request
+    def remember_write(response):
+        # Read-your-writes: the replica may lag, so keep this client on the primary for a while
+        if g.get('db_wrote') and app.config['SQLALCHEMY_BINDS'].get('replica'):
+            session['db_primary_until'] = time.time() + app.config['READ_YOUR_WRITES_WINDOW']
+        return response
+
+def read_replica(view):
+    """Allow a read-only view to run its queries against the read replica"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get('db_primary_until', 0) < time.time():
+            g.db_read_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
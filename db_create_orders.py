@@ -1,12 +1,12 @@
 
 from flask import Flask
 from models import db, Order, OrderItem
+from config import Config
 import os
 from sqlalchemy import text
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+pymysql://root:@localhost/kukuhub'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.from_object(Config())
 
 db.init_app(app)
 
@@ -1,20 +1,71 @@
-
-from flask import Flask
-from models import db, Message
-from app import app
+from models import db, User, SellerProfile, Message, Order, OrderItem, Job, ProductFacet, ProductRecommendation, RecommendationBuild
+from app import create_app
+from sqlalchemy import text
+from message_search import create_search_index
+from facets import rebuild_facets
 
 def update_database():
+    app = create_app()
     with app.app_context():
         try:
             # Add the new columns to the messages table if they don't exist
-            db.engine.execute("""
-                ALTER TABLE messages 
-                ADD COLUMN IF NOT EXISTS senderName VARCHAR(100) NULL,
-                ADD COLUMN IF NOT EXISTS senderEmail VARCHAR(100) NULL,
-                ADD COLUMN IF NOT EXISTS productName VARCHAR(255) NULL
-            """)
+            with db.engine.begin() as connection:
+                connection.execute(text("""
+                    ALTER TABLE messages
+                    ADD COLUMN IF NOT EXISTS senderName VARCHAR(100) NULL,
+                    ADD COLUMN IF NOT EXISTS senderEmail VARCHAR(100) NULL,
+                    ADD COLUMN IF NOT EXISTS productName VARCHAR(255) NULL
+                """))
             print("Messages table updated successfully")
-            
+
+            # Denormalized unread message counter, backfilled from the messages table
+            with db.engine.begin() as connection:
+                connection.execute(text("""
+                    ALTER TABLE seller_profile
+                    ADD COLUMN IF NOT EXISTS unread_message_count INT NOT NULL DEFAULT 0
+                """))
+                connection.execute(text("""
+                    UPDATE seller_profile SET unread_message_count = (
+                        SELECT COUNT(*) FROM messages
+                        WHERE messages.seller_id = seller_profile.seller_id AND messages.is_read = 0
+                    )
+                """))
+            print("Seller unread message counters backfilled")
+
+            # Create indexes added to the models after the tables were created
+            for table in (User.__table__, SellerProfile.__table__, Order.__table__, OrderItem.__table__, Message.__table__):
+                for index in table.indexes:
+                    index.create(db.engine, checkfirst=True)
+            print("Indexes created successfully")
+
+            Job.__table__.create(db.engine, checkfirst=True)
+            print("Jobs table created successfully")
+
+            ProductFacet.__table__.create(db.engine, checkfirst=True)
+            print(f"Product facets rebuilt: {rebuild_facets()} rows")
+
+            # Filled by `python recommendations.py` (needs numpy and scipy), then kept fresh by new orders
+            ProductRecommendation.__table__.create(db.engine, checkfirst=True)
+            RecommendationBuild.__table__.create(db.engine, checkfirst=True)
+            # Builds recorded before started_at existed fall back to their creation time
+            with db.engine.begin() as connection:
+                connection.execute(text("""
+                    ALTER TABLE recommendation_builds
+                    ADD COLUMN IF NOT EXISTS started_at DATETIME NULL
+                """))
+                connection.execute(text("""
+                    UPDATE recommendation_builds SET started_at = COALESCE(created_at, CURRENT_TIMESTAMP)
+                    WHERE started_at IS NULL
+                """))
+                connection.execute(text("""
+                    ALTER TABLE recommendation_builds
+                    MODIFY started_at DATETIME NOT NULL
+                """))
+            print("Recommendation tables created successfully")
+
+            create_search_index(db.engine)
+            print("Message search index created successfully")
+
             return True
         except Exception as e:
             print(f"Error updating database: {str(e)}")
@@ -0,0 +1,156 @@
+import json
+import os
+import queue
+import threading
+
+class LocalBackend:
+    """In-process fan-out.
+
+    Stands in for a shared pub/sub backend when the app runs as a single
+    process; with several workers each one only sees its own publishes.
+    """
+
+    def __init__(self):
+        self._deliver = None
+
+    def listen(self, deliver):
+        self._deliver = deliver
+
+    def start(self):
+        pass
+
+    def publish(self, channel, message):
+        if self._deliver:
+            self._deliver(channel, message)
+
+class RedisBackend:
+    """Fan-out through Redis pub/sub so every worker receives every event (needs the `redis` package)"""
+
+    def __init__(self, url, prefix='kukuhub:events:'):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._deliver = None
+        self._lock = threading.Lock()
+        self._listening_pid = None
+
+    def listen(self, deliver):
+        self._deliver = deliver
+
+    def start(self):
+        """Start the subscriber thread in this process (threads don't survive a fork)"""
+        if self._listening_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listening_pid == os.getpid():
+                return
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(f"{self._prefix}*")
+
+            def run():
+                for item in pubsub.listen():
+                    channel = item['channel'].decode('utf-8')[len(self._prefix):]
+                    self._deliver(channel, item['data'].decode('utf-8'))
+
+            threading.Thread(target=run, name='events-redis-listener', daemon=True).start()
+            self._listening_pid = os.getpid()
+
+    def publish(self, channel, message):
+        self._redis.publish(f"{self._prefix}{channel}", message)
+
+class EventBroker:
+    """Per-seller event streams for server-sent events.
+
+    Routes publish to a seller's channel; each open /api/seller/events
+    connection holds a bounded queue that the broker fills. A slow client
+    drops events rather than holding up publishers. Set EVENTS_REDIS_URL to
+    fan out across workers, otherwise events stay within this process.
+    """
+
+    def __init__(self, app=None, backend=None):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self.keepalive = 15
+        self.queue_size = 100
+        self.closed = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTS_REDIS_URL', None)
+        app.config.setdefault('EVENTS_KEEPALIVE', 15)
+        app.config.setdefault('EVENTS_QUEUE_SIZE', 100)
+        self.keepalive = app.config['EVENTS_KEEPALIVE']
+        self.queue_size = app.config['EVENTS_QUEUE_SIZE']
+
+        if self.backend is None:
+            if app.config['EVENTS_REDIS_URL']:
+                self.backend = RedisBackend(app.config['EVENTS_REDIS_URL'])
+            else:
+                self.backend = LocalBackend()
+        self.backend.listen(self._deliver)
+        app.extensions['event_broker'] = self
+
+    def subscribe(self, seller_id):
+        self.backend.start()
+        subscriber = queue.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(str(seller_id), set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, seller_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(str(seller_id))
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[str(seller_id)]
+
+    def publish(self, seller_id, event, data):
+        """Send `event` with a JSON-serializable payload to every stream open for the seller"""
+        try:
+            self.backend.publish(str(seller_id), json.dumps({'event': event, 'data': data}))
+        except Exception as e:
+            # Notifications are best effort; never fail the request that triggered them
+            print(f"Error publishing {event} event: {str(e)}")
+
+    def close(self):
+        """End every open stream, e.g. while the worker drains for a restart"""
+        self.closed = True
+        with self._lock:
+            subscribers = [s for channel in self._subscribers.values() for s in channel]
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def stream(self, seller_id):
+        """Generator of SSE frames for one connection; sends a comment line as keepalive"""
+        subscriber = self.subscribe(seller_id)
+        try:
+            yield "retry: 3000\n\n"
+            while not self.closed:
+                try:
+                    message = subscriber.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    # Closing: the browser reconnects to another worker after `retry`
+                    break
+                payload = json.loads(message)
+                yield f"event: {payload['event']}\ndata: {json.dumps(payload['data'])}\n\n"
+        finally:
+            self.unsubscribe(seller_id, subscriber)
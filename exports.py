@@ -0,0 +1,66 @@
+from flask import Response, current_app, stream_with_context
+from models import db
+from datetime import date, datetime
+import csv
+import io
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+# Rows fetched from the server-side cursor at a time, and rows per yielded chunk
+EXPORT_FETCH_SIZE = 1000
+EXPORT_CHUNK_ROWS = 500
+
+def _csv_cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # Keep spreadsheet apps from evaluating customer-supplied text as a formula
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+def csv_chunks(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_cell(value) for value in row])
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def ndjson_chunks(header, rows):
+    dumps = current_app.json.dumps
+    lines = []
+    for row in rows:
+        lines.append(dumps(dict(zip(header, row))))
+        if len(lines) == EXPORT_CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def export_response(statement, header, export_format, filename):
+    """Stream the rows of `statement` as CSV or NDJSON without loading them all.
+
+    yield_per makes SQLAlchemy use a server-side cursor where the driver has
+    one (MySQL) and fetch EXPORT_FETCH_SIZE rows at a time, so memory stays
+    flat however many rows match.
+    """
+    def generate():
+        rows = db.session.execute(statement.execution_options(yield_per=EXPORT_FETCH_SIZE))
+        try:
+            chunks = csv_chunks if export_format == 'csv' else ndjson_chunks
+            yield from chunks(header, rows)
+        finally:
+            rows.close()
+
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}-{stamp}.{export_format}"'}
+    )
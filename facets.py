@@ -0,0 +1,125 @@
+"""Per-category product counts and price histograms (the `product_facets` table).
+
+Routes that add, change or remove products record the change in a
+FacetDeltas and apply() it before committing, so the summary moves in the
+same transaction as the products. After loading products outside the API
+(generate_data.py, manual SQL) rebuild it with `python facets.py`.
+"""
+from models import db, Product, ProductFacet
+from bisect import bisect_right
+
+# Lower bounds (KES) of the price histogram buckets; the last bucket is open-ended
+PRICE_BUCKETS = (0, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+
+def price_bucket(price):
+    return max(bisect_right(PRICE_BUCKETS, price) - 1, 0)
+
+def bucket_bounds(bucket):
+    upper = PRICE_BUCKETS[bucket + 1] if bucket + 1 < len(PRICE_BUCKETS) else None
+    return PRICE_BUCKETS[bucket], upper
+
+def _upsert(rows):
+    """Add rows' counts onto product_facets, inserting missing (category, bucket) rows"""
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(ProductFacet).values(rows)
+        statement = statement.on_duplicate_key_update(
+            product_count=ProductFacet.product_count + statement.inserted.product_count,
+            in_stock_count=ProductFacet.in_stock_count + statement.inserted.in_stock_count
+        )
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(ProductFacet).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=['category', 'bucket'],
+            set_={
+                'product_count': ProductFacet.product_count + statement.excluded.product_count,
+                'in_stock_count': ProductFacet.in_stock_count + statement.excluded.in_stock_count
+            }
+        )
+    db.session.execute(statement)
+
+class FacetDeltas:
+    """Facet count changes for the products added, removed or changed in one transaction"""
+
+    def __init__(self):
+        self._deltas = {}
+
+    def add(self, category, price, stock, sign=1):
+        key = (category, price_bucket(price))
+        count, in_stock = self._deltas.get(key, (0, 0))
+        self._deltas[key] = (count + sign, in_stock + (sign if stock > 0 else 0))
+
+    def remove(self, category, price, stock):
+        self.add(category, price, stock, sign=-1)
+
+    def change(self, before, after):
+        """Record a product going from (category, price, stock) `before` to `after`"""
+        if before != after:
+            self.remove(*before)
+            self.add(*after)
+
+    def apply(self):
+        """Write the accumulated changes to the current session with one upsert"""
+        rows = [{'category': category, 'bucket': bucket, 'product_count': count, 'in_stock_count': in_stock}
+                for (category, bucket), (count, in_stock) in self._deltas.items() if count or in_stock]
+        if rows:
+            _upsert(rows)
+        self._deltas.clear()
+
+def rebuild_facets():
+    """Recompute product_facets from the products table in one transaction; returns rows written"""
+    bucket = db.case(
+        *[(Product.price < upper, index) for index, upper in enumerate(PRICE_BUCKETS[1:])],
+        else_=len(PRICE_BUCKETS) - 1
+    )
+    summary = db.select(
+        Product.category,
+        bucket,
+        db.func.count(),
+        db.func.sum(db.case((Product.stock > 0, 1), else_=0))
+    ).group_by(Product.category, bucket)
+    try:
+        db.session.query(ProductFacet).delete(synchronize_session=False)
+        written = db.session.execute(db.insert(ProductFacet).from_select(
+            ['category', 'bucket', 'product_count', 'in_stock_count'], summary
+        )).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return written
+
+def category_facets():
+    """[{category, productCount, inStockCount, minPrice, maxPrice, histogram}] from the summary table"""
+    rows = db.session.query(
+        ProductFacet.category, ProductFacet.bucket, ProductFacet.product_count, ProductFacet.in_stock_count
+    ).filter(ProductFacet.product_count > 0).order_by(ProductFacet.category, ProductFacet.bucket)
+
+    categories = {}
+    for category, bucket, count, in_stock in rows:
+        facet = categories.get(category)
+        if facet is None:
+            facet = categories[category] = {'category': category, 'productCount': 0, 'inStockCount': 0,
+                                            'minPrice': None, 'maxPrice': None, 'histogram': []}
+        low, high = bucket_bounds(bucket)
+        facet['productCount'] += count
+        facet['inStockCount'] += in_stock
+        # Bucket bounds: the cheapest and dearest products lie within these
+        if facet['minPrice'] is None:
+            facet['minPrice'] = low
+        facet['maxPrice'] = high
+        facet['histogram'].append({'min': low, 'max': high, 'count': count, 'inStock': in_stock})
+    return list(categories.values())
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        print(f"Rebuilt product facets: {rebuild_facets()} rows")
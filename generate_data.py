@@ -0,0 +1,300 @@
+"""Generate synthetic users, sellers, products, orders and messages for load and capacity tests.
+
+    python generate_data.py --users 1000000 --sellers 5000 --products 2000000 \
+        --orders 3000000 --messages 1000000 --seed 7
+
+The same arguments and seed always produce the same rows. Product and seller
+popularity follow a Zipf distribution, so a few products dominate orders and
+messages and a few sellers own most of the catalog, as in real marketplaces.
+Rows are appended after the current highest IDs, so the tool can add to an
+existing database. Set DATABASE_URL (or --database-url) to choose MySQL or SQLite.
+"""
+from models import db, User, SellerProfile, Product, Order, OrderItem, Message
+from werkzeug.security import generate_password_hash
+from datetime import datetime, timedelta
+from bisect import bisect_left
+import argparse
+import os
+import random
+import sys
+import time
+
+EMAIL_DOMAIN = 'gen.kukuhub.test'
+DEFAULT_PASSWORD = 'password123'
+# Timestamps are spread over the days before this, so reruns produce identical rows
+GENERATED_UNTIL = datetime(2025, 1, 1)
+
+CATEGORIES = {
+    'Chicken': (['Kienyeji', 'Broiler', 'Kuroiler', 'Layer', 'Rainbow Rooster'], (600, 2500)),
+    'Eggs': (['Kienyeji Eggs', 'Layer Eggs', 'Fertilized Eggs', 'Quail Eggs'], (300, 900)),
+    'Chicks': (['Day-old Kienyeji Chicks', 'Broiler Chicks', 'Kuroiler Chicks'], (80, 250)),
+    'Feeds': (['Layers Mash', 'Chick Mash', 'Growers Mash', 'Broiler Finisher'], (1500, 4500)),
+    'Equipment': (['Feeder', 'Drinker', 'Incubator', 'Brooder Lamp', 'Egg Tray'], (150, 45000)),
+    'Medicine': (['Newcastle Vaccine', 'Gumboro Vaccine', 'Dewormer', 'Vitamin Boost'], (200, 1800)),
+}
+TOWNS = ['Nairobi', 'Kisumu', 'Nakuru', 'Eldoret', 'Mombasa', 'Thika', 'Kakamega', 'Nyeri', 'Machakos']
+MESSAGE_TEMPLATES = [
+    'Is {product} still available? I need it delivered to {town}.',
+    'What is your best price for {quantity} units of {product}?',
+    'Do you deliver {product} to {town} and how long does it take?',
+    'Hello, I would like to order {quantity} {product}. Can I pay with M-Pesa?',
+    'Are the {product} vaccinated? I am in {town}.',
+]
+
+def user_email(user_id):
+    return f'user{user_id}@{EMAIL_DOMAIN}'
+
+def seller_email(seller_id):
+    return f'seller{seller_id}@{EMAIL_DOMAIN}'
+
+class ZipfSampler:
+    """Draws ranks 0..n-1 with probability proportional to 1 / (rank + 1) ** exponent"""
+
+    def __init__(self, n, exponent, rng):
+        self.rng = rng
+        self.cumulative = []
+        total = 0.0
+        for rank in range(1, n + 1):
+            total += rank ** -exponent
+            self.cumulative.append(total)
+        self.total = total
+
+    def draw(self):
+        return min(bisect_left(self.cumulative, self.rng.random() * self.total), len(self.cumulative) - 1)
+
+class Loader:
+    """Inserts rows in batches on one connection, committing and reporting progress per batch"""
+
+    def __init__(self, connection, progress=True):
+        self.connection = connection
+        self.progress = progress
+
+    def load(self, label, total, batches):
+        """`batches` yields lists of (table, rows) pairs that are committed together"""
+        started = time.perf_counter()
+        done = 0
+        for batch in batches:
+            for table, rows in batch:
+                if rows:
+                    # executemany: PyMySQL sends one multi-row INSERT per batch, SQLite reuses one prepared statement
+                    self.connection.execute(table.insert(), rows)
+            self.connection.commit()
+            done += len(batch[0][1])
+            if self.progress:
+                rate = done / max(time.perf_counter() - started, 1e-9)
+                print(f"\r{label}: {done}/{total} ({rate:,.0f} rows/s)", end='', flush=True)
+        if self.progress:
+            print(f"\r{label}: {done}/{total} in {time.perf_counter() - started:.1f}s".ljust(60))
+
+def next_id(connection, column):
+    return (connection.execute(db.select(db.func.max(column))).scalar() or 0) + 1
+
+def chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+def generate(engine, users, sellers, products, orders, messages, seed=42, zipf=1.1, max_items=3,
+             days=365, batch_size=5000, password=DEFAULT_PASSWORD, progress=True):
+    """Append generated rows through `engine`; returns the first ID and count of each entity"""
+    rng = random.Random(seed)
+    now = GENERATED_UNTIL
+    span = timedelta(days=days)
+    # Password hashing is deliberately slow; every generated account shares one hash
+    password_hash = generate_password_hash(password)
+
+    with engine.connect() as connection:
+        mysql = connection.dialect.name == 'mysql'
+        if mysql:
+            # Generated rows are consistent by construction; skip per-row checks while loading
+            connection.exec_driver_sql('SET SESSION foreign_key_checks = 0, unique_checks = 0')
+        try:
+            first = {
+                'user': next_id(connection, User.user_id),
+                'seller': next_id(connection, SellerProfile.seller_id),
+                'product': next_id(connection, Product.product_id),
+                'order': next_id(connection, Order.order_id),
+                'message': next_id(connection, Message.message_id),
+            }
+            loader = Loader(connection, progress)
+
+            def timestamp(index, total):
+                return now - span + span * (index / max(total, 1))
+
+            def user_batches():
+                for start, end in chunks(users, batch_size):
+                    yield [(User.__table__, [{
+                        'user_id': first['user'] + i, 'username': f'user{first["user"] + i}',
+                        'email': user_email(first['user'] + i), 'password_hash': password_hash,
+                        'phone_number': f'2547{rng.randrange(10 ** 8):08d}', 'created_at': timestamp(i, users)
+                    } for i in range(start, end)])]
+
+            def seller_batches():
+                for start, end in chunks(sellers, batch_size):
+                    rows = []
+                    for i in range(start, end):
+                        seller_id = first['seller'] + i
+                        # The biggest sellers (lowest ranks) are always approved
+                        status = 'approved' if i < 10 else rng.choices(['approved', 'pending', 'rejected'], [80, 15, 5])[0]
+                        rows.append({
+                            'seller_id': seller_id, 'username': f'seller{seller_id}', 'email': seller_email(seller_id),
+                            'password_hash': password_hash, 'business_name': f'{rng.choice(TOWNS)} Poultry Farm {seller_id}',
+                            'business_description': 'Generated seller', 'approval_status': status,
+                            'phone_number': f'2547{rng.randrange(10 ** 8):08d}', 'unread_message_count': 0,
+                            'approved_at': timestamp(i, sellers) if status == 'approved' else None,
+                            'created_at': timestamp(i, sellers)
+                        })
+                    yield [(SellerProfile.__table__, rows)]
+
+            # Kept for orders and messages: owner, price and name of every generated product
+            product_seller, product_price, product_name = [], [], []
+            seller_rank = ZipfSampler(sellers, zipf, rng)
+
+            def product_batches():
+                categories = list(CATEGORIES)
+                for start, end in chunks(products, batch_size):
+                    rows = []
+                    for i in range(start, end):
+                        category = rng.choice(categories)
+                        names, (low, high) = CATEGORIES[category]
+                        name = f'{rng.choice(names)} #{first["product"] + i}'
+                        price = round(rng.uniform(low, high), -1)
+                        seller_id = first['seller'] + seller_rank.draw()
+                        product_seller.append(seller_id)
+                        product_price.append(price)
+                        product_name.append(name)
+                        rows.append({
+                            'product_id': first['product'] + i, 'name': name,
+                            'description': f'{name} from {rng.choice(TOWNS)}', 'price': price,
+                            'stock': rng.randint(0, 500), 'category': category, 'seller_id': seller_id,
+                            'created_at': timestamp(i, products), 'updated_at': timestamp(i, products)
+                        })
+                    yield [(Product.__table__, rows)]
+
+            loader.load('users', users, user_batches())
+            loader.load('sellers', sellers, seller_batches())
+            loader.load('products', products, product_batches())
+
+            # Popularity ranks map to shuffled products, so best sellers are spread across IDs
+            popular = list(range(products))
+            rng.shuffle(popular)
+            product_rank = ZipfSampler(products, zipf, rng)
+
+            def popular_product():
+                return popular[product_rank.draw()]
+
+            def order_batches():
+                outcomes = [('confirmed', 'completed'), ('dispatched', 'completed'), ('delivered', 'completed'),
+                            ('pending', 'pending'), ('cancelled', 'failed')]
+                for start, end in chunks(orders, batch_size):
+                    order_rows, item_rows = [], []
+                    for i in range(start, end):
+                        order_id = first['order'] + i
+                        created = timestamp(i, orders)
+                        chosen = {popular_product() for _ in range(rng.randint(1, max_items))}
+                        total = 0.0
+                        for index in sorted(chosen):
+                            quantity = rng.randint(1, 10)
+                            price = product_price[index]
+                            total += price * quantity
+                            item_rows.append({
+                                'order_id': order_id, 'product_id': first['product'] + index, 'quantity': quantity,
+                                'unit_price': price, 'total_price': price * quantity, 'created_at': created
+                            })
+                        status, payment_status = rng.choices(outcomes, [40, 25, 20, 5, 10])[0]
+                        user_id = first['user'] + rng.randrange(users) if users else None
+                        order_rows.append({
+                            'order_id': order_id, 'order_number': f'GEN{order_id:010d}', 'user_id': user_id,
+                            'customer_name': f'user{user_id}' if user_id else 'Guest',
+                            'customer_email': user_email(user_id) if user_id else None,
+                            'customer_phone': f'2547{rng.randrange(10 ** 8):08d}', 'total_amount': total,
+                            'status': status, 'payment_status': payment_status, 'payment_method': 'mpesa',
+                            'mpesa_checkout_request_id': f'ws_CO_GEN{order_id:010d}',
+                            'mpesa_receipt_number': f'R{order_id:09d}' if payment_status == 'completed' else None,
+                            'created_at': created, 'updated_at': created
+                        })
+                    yield [(Order.__table__, order_rows), (OrderItem.__table__, item_rows)]
+
+            def message_batches():
+                for start, end in chunks(messages, batch_size):
+                    rows = []
+                    for i in range(start, end):
+                        index = popular_product()
+                        sender = rng.randrange(users) + first['user'] if users else None
+                        rows.append({
+                            'message_id': first['message'] + i,
+                            'content': rng.choice(MESSAGE_TEMPLATES).format(
+                                product=product_name[index], town=rng.choice(TOWNS), quantity=rng.randint(1, 200)),
+                            'senderName': f'user{sender}' if sender else 'Anonymous',
+                            'senderEmail': user_email(sender) if sender else 'no-email@example.com',
+                            'productName': product_name[index], 'user_id': sender,
+                            'seller_id': product_seller[index], 'product_id': first['product'] + index,
+                            'is_read': rng.random() < 0.7, 'created_at': timestamp(i, messages)
+                        })
+                    yield [(Message.__table__, rows)]
+
+            if products:
+                loader.load('orders', orders, order_batches())
+                loader.load('messages', messages, message_batches())
+
+            # Keep the denormalized unread counters in step with the generated messages
+            connection.execute(db.text("""
+                UPDATE seller_profile SET unread_message_count = (
+                    SELECT COUNT(*) FROM messages
+                    WHERE messages.seller_id = seller_profile.seller_id AND messages.is_read = 0
+                ) WHERE seller_id >= :first_seller
+            """), {'first_seller': first['seller']})
+            connection.commit()
+        finally:
+            if mysql:
+                connection.exec_driver_sql('SET SESSION foreign_key_checks = 1, unique_checks = 1')
+
+    return {
+        'users': (first['user'], users),
+        'sellers': (first['seller'], sellers),
+        'products': (first['product'], products),
+        'orders': (first['order'], orders if products else 0),
+        'messages': (first['message'], messages if products else 0),
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic KukuHub data for load testing')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--sellers', type=int, default=50)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--max-items', type=int, default=3, help='most distinct products per order')
+    parser.add_argument('--zipf', type=float, default=1.1, help='popularity skew; higher is more skewed')
+    parser.add_argument('--days', type=int, default=365, help='spread created_at over this many days')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per INSERT batch and transaction')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='password for every generated account')
+    parser.add_argument('--database-url', help='overrides DATABASE_URL')
+    parser.add_argument('--create-tables', action='store_true', help='create missing tables first')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    if args.sellers < 1 and args.products:
+        print("Error: products need at least one seller")
+        sys.exit(1)
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+        try:
+            summary = generate(db.engine, args.users, args.sellers, args.products, args.orders, args.messages,
+                               seed=args.seed, zipf=args.zipf, max_items=args.max_items, days=args.days,
+                               batch_size=args.batch_size, password=args.password)
+        except Exception as e:
+            print(f"\nError generating data: {str(e)}")
+            sys.exit(1)
+
+    for entity, (first_id, count) in summary.items():
+        print(f"{entity}: {count} rows from id {first_id}")
+    print(f"Accounts log in as {user_email(summary['users'][0])} / {seller_email(summary['sellers'][0])} with the given password")
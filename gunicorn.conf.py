@@ -0,0 +1,69 @@
+"""Gunicorn settings for the KukuHub API: gunicorn -c gunicorn.conf.py
+
+Every setting can be overridden from the environment. The app is loaded
+once in the master (preload_app) and warmed up there, so workers share
+the imported code and cached catalog copy-on-write.
+"""
+import multiprocessing
+import os
+import signal
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads, not sync workers: each open SSE stream (/api/seller/events) holds one
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# On SIGTERM, in-flight requests get this long to finish before the worker is killed
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then to cap memory growth; jitter avoids restarting them all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+def on_starting(server):
+    # The default event backend only reaches SSE clients of the worker that published the event,
+    # so with several workers most seller notifications would silently go nowhere
+    if server.cfg.workers > 1 and not os.environ.get('EVENTS_REDIS_URL'):
+        raise SystemExit(
+            f"Refusing to start {server.cfg.workers} workers without EVENTS_REDIS_URL: seller events would only "
+            "reach clients of the worker that published them. Set EVENTS_REDIS_URL=redis://... or WEB_CONCURRENCY=1."
+        )
+
+def post_fork(server, worker):
+    from wsgi import app
+    from models import db
+
+    # Never reuse connections inherited from the master
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def post_worker_init(worker):
+    from wsgi import app
+    from server import begin_draining, prime_db_pool, start_background_workers
+
+    prime_db_pool(app)
+    start_background_workers(app)
+
+    # Start draining as soon as the worker is asked to stop, then let gunicorn finish requests
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        begin_draining(app)
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+
+def worker_exit(server, worker):
+    from wsgi import app
+    from server import stop_background_workers
+
+    stop_background_workers(app)
@@ -0,0 +1,274 @@
+"""Durable background jobs stored in the `jobs` table.
+
+    @task(queue='notifications', priority=10)
+    def notify_order_sellers(order_id):
+        ...
+
+    enqueue('notify_order_sellers', {'order_id': order.order_id})
+    db.session.commit()  # the job is saved with the rest of the request's writes
+
+Run workers inside the web processes (server.start_background_workers) or on
+their own with `python worker.py`.
+"""
+from models import db, Job
+from database import RoutingSession
+from sqlalchemy import event, select, update
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+import metrics
+
+# Task name -> {'fn', 'queue', 'priority', 'max_attempts', 'publishes_events'}
+TASKS = {}
+
+JOBS_PROCESSED = metrics.Counter('jobs_processed_total', 'Background jobs run, by queue and outcome',
+                                 ('queue', 'outcome'))
+JOB_DURATION = metrics.Histogram('job_duration_seconds', 'Background job run time', ('queue', 'name'))
+metrics.REGISTRY.extend([JOBS_PROCESSED, JOB_DURATION])
+
+# Started runners in this process, woken when a session commits new jobs
+_runners = []
+
+def task(name=None, queue='default', priority=0, max_attempts=5, publishes_events=False):
+    """Register a function as a job task; it is called with the job's payload as keyword arguments.
+
+    Mark tasks that publish SSE events with publishes_events: without a
+    shared event backend only the web processes can deliver those.
+    """
+    def register(fn):
+        TASKS[name or fn.__name__] = {'fn': fn, 'queue': queue, 'priority': priority, 'max_attempts': max_attempts,
+                                      'publishes_events': publishes_events}
+        return fn
+    return register
+
+def enqueue(name, payload=None, delay=0, priority=None, queue=None, unique=False):
+    """Add a job to the current session; it is saved (and runnable) when the caller commits.
+
+    With unique=True nothing is added (and None returned) while a job of the
+    same name is still queued, which debounces refreshes triggered by every
+    request. Two requests racing may still both add one.
+    """
+    spec = TASKS[name]
+    queue = queue or spec['queue']
+    if unique and db.session.query(Job.job_id).filter(
+        Job.queue == queue, Job.status == 'queued', Job.name == name
+    ).first():
+        return None
+    job = Job(
+        queue=queue,
+        name=name,
+        payload=json.dumps(payload or {}),
+        priority=spec['priority'] if priority is None else priority,
+        max_attempts=spec['max_attempts'],
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _wake_runners(session):
+    if session.info.pop('jobs_enqueued', False):
+        for runner in _runners:
+            runner.wake()
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('jobs_enqueued', None)
+
+class JobRunner:
+    """Worker threads that claim and run jobs, JOB_QUEUES[queue] threads per queue.
+
+    A job is claimed by the first worker that moves it from `queued` to
+    `running`: on MySQL 8 with SELECT ... FOR UPDATE SKIP LOCKED, so workers
+    in other processes skip rows already being claimed instead of waiting
+    on them; on SQLite, which runs one writer at a time, with a single
+    UPDATE of the next due row. Higher priority runs first, then older
+    run_at. A failing job is retried after an exponential backoff (with
+    jitter) until max_attempts, then left as `failed` with its traceback.
+    Jobs still `running` after JOB_LEASE_SECONDS are assumed to belong to a
+    dead worker and queued again, so tasks should be safe to run twice.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._last_maintenance = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('JOB_QUEUES', {'default': 2})
+        app.config.setdefault('JOB_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOB_RETRY_BASE', 10)
+        app.config.setdefault('JOB_RETRY_MAX', 3600)
+        app.config.setdefault('JOB_LEASE_SECONDS', 300)
+        app.config.setdefault('JOB_KEEP_DONE_SECONDS', 86400)
+        app.extensions['job_runner'] = self
+
+    def queues(self):
+        """{queue: worker threads}; queues that only appear in TASKS get one thread"""
+        queues = dict(self.app.config['JOB_QUEUES'])
+        for spec in TASKS.values():
+            queues.setdefault(spec['queue'], 1)
+        return {name: count for name, count in queues.items() if count > 0}
+
+    def start(self):
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop.clear()
+        self._threads = []
+        for queue, count in self.queues().items():
+            for i in range(count):
+                thread = threading.Thread(target=self._run, args=(queue,), name=f"jobs-{queue}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        if self not in _runners:
+            _runners.append(self)
+
+    def stop(self, timeout=None):
+        """Let running jobs finish, then stop the worker threads"""
+        self._stop.set()
+        self.wake()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        if self in _runners:
+            _runners.remove(self)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _run(self, queue):
+        worker = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+        while not self._stop.is_set():
+            ran = False
+            try:
+                with self.app.app_context():
+                    ran = self.run_one(queue, worker)
+                    if not ran:
+                        self._maintain()
+            except Exception as e:
+                print(f"Job worker error: {str(e)}")
+            if not ran and not self._stop.is_set():
+                with self._cond:
+                    self._cond.wait(self.app.config['JOB_POLL_INTERVAL'])
+
+    def claim(self, queue, worker='local'):
+        """Mark the next due job of `queue` as running; returns (job_id, name, payload, attempts, max_attempts, token) or None"""
+        now = datetime.utcnow()
+        token = f"{worker}:{uuid.uuid4().hex[:8]}"[-100:]
+        due = select(Job.job_id).where(
+            Job.queue == queue, Job.status == 'queued', Job.run_at <= now
+        ).order_by(Job.priority.desc(), Job.run_at, Job.job_id).limit(1)
+        claim = update(Job).values(
+            status='running', locked_by=token, locked_at=now, attempts=Job.attempts + 1
+        ).execution_options(synchronize_session=False)
+
+        try:
+            if db.engine.dialect.name == 'sqlite':
+                # No row locks, but writers are serialized, so one UPDATE claims atomically
+                job_id = db.session.execute(claim.where(
+                    Job.job_id == due.scalar_subquery(), Job.status == 'queued'
+                ).returning(Job.job_id)).scalar()
+            else:
+                job_id = db.session.execute(due.with_for_update(skip_locked=True)).scalar()
+                if job_id is not None:
+                    db.session.execute(claim.where(Job.job_id == job_id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if job_id is None:
+            return None
+
+        row = db.session.query(
+            Job.job_id, Job.name, Job.payload, Job.attempts, Job.max_attempts
+        ).filter(Job.job_id == job_id).one()
+        db.session.commit()
+        return (*row, token)
+
+    def run_one(self, queue, worker='local'):
+        """Claim and run one job from `queue`; returns False if none was due"""
+        claimed = self.claim(queue, worker)
+        if claimed is None:
+            return False
+        job_id, name, payload, attempts, max_attempts, token = claimed
+
+        started = time.perf_counter()
+        try:
+            spec = TASKS.get(name)
+            if spec is None:
+                raise LookupError(f"Unknown task {name}")
+            spec['fn'](**json.loads(payload))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Job {job_id} ({name}) failed on attempt {attempts}: {str(e)}")
+            self._failed(job_id, token, attempts, max_attempts, traceback.format_exc())
+            outcome = 'retried' if attempts < max_attempts else 'failed'
+        else:
+            self._finish(job_id, token, status='done', finished_at=datetime.utcnow(), last_error=None)
+            outcome = 'done'
+
+        JOBS_PROCESSED.inc((queue, outcome))
+        JOB_DURATION.observe((queue, name), time.perf_counter() - started)
+        return True
+
+    def _finish(self, job_id, token, **values):
+        # A job requeued after its lease ran out belongs to another worker now
+        db.session.execute(update(Job).where(Job.job_id == job_id, Job.locked_by == token).values(
+            locked_by=None, locked_at=None, **values
+        ).execution_options(synchronize_session=False))
+        db.session.commit()
+
+    def _failed(self, job_id, token, attempts, max_attempts, error):
+        error = error[-4000:]
+        if attempts >= max_attempts:
+            self._finish(job_id, token, status='failed', finished_at=datetime.utcnow(), last_error=error)
+            return
+        delay = min(self.app.config['JOB_RETRY_BASE'] * 2 ** (attempts - 1), self.app.config['JOB_RETRY_MAX'])
+        # Jitter keeps jobs that failed together (e.g. on a DB outage) from retrying together
+        run_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+        self._finish(job_id, token, status='queued', run_at=run_at, last_error=error)
+
+    def _maintain(self):
+        """Requeue jobs whose lease ran out and drop old finished jobs, at most once per half lease"""
+        lease = self.app.config['JOB_LEASE_SECONDS']
+        if time.monotonic() - self._last_maintenance < lease / 2:
+            return
+        self._last_maintenance = time.monotonic()
+
+        now = datetime.utcnow()
+        stale = (Job.status == 'running', Job.locked_at < now - timedelta(seconds=lease))
+        options = {'synchronize_session': False}
+        failed = db.session.execute(update(Job).where(*stale, Job.attempts >= Job.max_attempts).values(
+            status='failed', locked_by=None, locked_at=None, finished_at=now, last_error='Lease expired'
+        ).execution_options(**options)).rowcount
+        requeued = db.session.execute(update(Job).where(*stale).values(
+            status='queued', locked_by=None, locked_at=None, run_at=now
+        ).execution_options(**options)).rowcount
+        db.session.query(Job).filter(
+            Job.status == 'done',
+            Job.finished_at < now - timedelta(seconds=self.app.config['JOB_KEEP_DONE_SECONDS'])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if failed or requeued:
+            print(f"Jobs with expired leases: {requeued} requeued, {failed} failed")
+
+    def stats(self):
+        """{queue: {status: count}} over the whole table"""
+        stats = {}
+        for queue, status, count in db.session.query(Job.queue, Job.status, db.func.count()).group_by(Job.queue, Job.status):
+            stats.setdefault(queue, {})[status] = count
+        return stats
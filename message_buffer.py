@@ -0,0 +1,244 @@
+from models import db, Message, SellerProfile
+from sqlalchemy import case
+from sqlalchemy.exc import DataError, IntegrityError
+from datetime import datetime
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+class MessageBuffer:
+    """Write-behind buffer for buyer-to-seller messages.
+
+    send_message validates the seller against a cached set of seller IDs
+    and appends the message here (senders are throttled by rate_limit.py). A
+    flusher thread writes the buffer with one multi-row INSERT (plus one
+    counter UPDATE) whenever MESSAGE_BUFFER_SIZE messages are waiting or
+    MESSAGE_FLUSH_INTERVAL seconds pass. Messages still buffered when the
+    process exits, or that could not be written, are appended to a spool
+    file of this process next to MESSAGE_SPOOL_PATH (message_spool.<pid>.jsonl)
+    and replayed; the next process to start adopts spools of exited ones.
+    Rows the database rejects go to message_spool.rejected.jsonl.
+    """
+
+    def __init__(self, app=None, on_flush=None):
+        self.app = None
+        # Called with {seller_id: new message count} after each successful flush
+        self.on_flush = on_flush
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._sellers = set()
+        self._sellers_loaded_at = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('MESSAGE_BUFFER_SIZE', 200)
+        app.config.setdefault('MESSAGE_FLUSH_INTERVAL', 1.0)
+        app.config.setdefault('MESSAGE_SELLER_CACHE_TTL', 300)
+        app.config.setdefault('MESSAGE_SPOOL_PATH', os.path.join(app.instance_path, 'message_spool.jsonl'))
+        app.extensions['message_buffer'] = self
+        atexit.register(self.stop)
+
+    def is_seller(self, seller_id):
+        """Check a seller ID against the cached set, falling back to the database on a miss"""
+        if time.time() - self._sellers_loaded_at > self.app.config['MESSAGE_SELLER_CACHE_TTL']:
+            self._sellers = {seller_id for (seller_id,) in db.session.query(SellerProfile.seller_id)}
+            self._sellers_loaded_at = time.time()
+        if seller_id in self._sellers:
+            return True
+        # Sellers who registered since the last refresh
+        if db.session.query(SellerProfile.seller_id).filter_by(seller_id=seller_id).first():
+            self._sellers.add(seller_id)
+            return True
+        return False
+
+    def invalidate_sellers(self):
+        self._sellers_loaded_at = 0
+
+    def submit(self, message):
+        """Buffer a row for the messages table (a dict of column values)"""
+        message.setdefault('created_at', datetime.utcnow())
+        message.setdefault('is_read', False)
+        with self._cond:
+            self._pending.append(message)
+            if len(self._pending) >= self.app.config['MESSAGE_BUFFER_SIZE']:
+                self._cond.notify()
+        self.start()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+            try:
+                self._replay_spool(adopt=True)
+            except Exception as e:
+                print(f"Error replaying message spool: {str(e)}")
+            self._thread = threading.Thread(target=self._run, name='message-buffer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Flush what is buffered; anything that cannot be written goes to the spool file"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        with self._cond:
+            leftover, self._pending = self._pending, []
+        if leftover:
+            self._spool(leftover)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._pending) < self.app.config['MESSAGE_BUFFER_SIZE']:
+                    self._cond.wait(self.app.config['MESSAGE_FLUSH_INTERVAL'])
+                stopping = self._stopping
+                if not stopping:
+                    # Retry anything an earlier failed flush had to spool
+                    try:
+                        self._replay_spool()
+                    except Exception as e:
+                        print(f"Error replaying message spool: {str(e)}")
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in message buffer flusher: {str(e)}")
+            if stopping:
+                return
+
+    def flush(self):
+        """Write all buffered messages; returns how many were written.
+
+        The batch goes in one transaction. If the database rejects it, the
+        rows are retried one by one so a single bad row (too long for its
+        column, a seller deleted since validation) is set aside in the
+        rejected file instead of failing every batch it rejoins. Rows that
+        fail for any other reason (database unreachable) are spooled.
+        """
+        with self._cond:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+
+        try:
+            with self.app.app_context():
+                counts = write_messages(batch)
+            written = len(batch)
+        except Exception as e:
+            print(f"Error flushing message buffer: {str(e)}")
+            counts, written = self._write_one_by_one(batch)
+
+        if self.on_flush and counts:
+            try:
+                with self.app.app_context():
+                    self.on_flush(counts)
+            except Exception as e:
+                print(f"Error after flushing message buffer: {str(e)}")
+        return written
+
+    def _write_one_by_one(self, batch):
+        counts, written, rejected = {}, 0, []
+        for i, message in enumerate(batch):
+            try:
+                with self.app.app_context():
+                    for seller_id, count in write_messages([message]).items():
+                        counts[seller_id] = counts.get(seller_id, 0) + count
+                written += 1
+            except (IntegrityError, DataError) as e:
+                print(f"Rejected buffered message for seller {message.get('seller_id')}: {str(e)}")
+                rejected.append(message)
+            except Exception as e:
+                print(f"Error writing buffered message: {str(e)}")
+                self._spool(batch[i:])
+                break
+        if rejected:
+            self._spool(rejected, self._rejected_path())
+        return counts, written
+
+    def _spool_path(self, pid=None):
+        # One spool per process: gunicorn workers share MESSAGE_SPOOL_PATH
+        root, ext = os.path.splitext(self.app.config['MESSAGE_SPOOL_PATH'])
+        return f"{root}.{pid or os.getpid()}{ext}"
+
+    def _rejected_path(self):
+        root, ext = os.path.splitext(self.app.config['MESSAGE_SPOOL_PATH'])
+        return f"{root}.rejected{ext}"
+
+    def _spool(self, batch, path=None):
+        path = path or self._spool_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as spool:
+            for message in batch:
+                spool.write(json.dumps(message, default=datetime.isoformat) + '\n')
+        print(f"Spooled {len(batch)} messages to {path}")
+
+    def _orphan_spools(self):
+        """Spools left by processes that have exited (and the unsuffixed one older versions wrote)"""
+        root, ext = os.path.splitext(self.app.config['MESSAGE_SPOOL_PATH'])
+        orphans = [self.app.config['MESSAGE_SPOOL_PATH']]
+        for path in glob.glob(f"{glob.escape(root)}.*{ext}"):
+            pid = path[len(root) + 1:len(path) - len(ext)]
+            if not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                orphans.append(path)
+            except OSError:
+                pass  # alive, owned by another user
+        return orphans
+
+    def _replay_spool(self, adopt=False):
+        """Move spooled messages back into the buffer; with adopt, also those of exited processes"""
+        paths = [self._spool_path()] + (self._orphan_spools() if adopt else [])
+        replay = self._spool_path() + '.replay'
+        for path in paths:
+            try:
+                # Claim the file first so no other process replays it too
+                os.replace(path, replay)
+            except FileNotFoundError:
+                continue
+            with open(replay) as spool:
+                for line in spool:
+                    try:
+                        message = json.loads(line)
+                        message['created_at'] = datetime.fromisoformat(message['created_at'])
+                    except (ValueError, KeyError, TypeError):
+                        print(f"Skipping unreadable line in message spool {path}")
+                        continue
+                    self._pending.append(message)
+            os.remove(replay)
+
+def write_messages(batch):
+    """Insert buffered messages with one multi-row INSERT and bump unread counters with one UPDATE.
+
+    Returns {seller_id: number of messages written}.
+    """
+    counts = {}
+    for message in batch:
+        counts[message['seller_id']] = counts.get(message['seller_id'], 0) + 1
+
+    try:
+        db.session.execute(Message.__table__.insert(), batch)
+        SellerProfile.query.filter(SellerProfile.seller_id.in_(counts)).update(
+            {SellerProfile.unread_message_count: SellerProfile.unread_message_count + case(
+                counts, value=SellerProfile.seller_id, else_=0
+            )},
+            synchronize_session=False
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return counts
@@ -0,0 +1,78 @@
+from models import db, Message
+from sqlalchemy import DDL, event, text
+from sqlalchemy.dialects.mysql import match
+import re
+
+SEARCH_COLUMNS = ('content', 'senderName', 'senderEmail', 'productName')
+
+# MySQL keeps the FULLTEXT index declared on Message up to date by itself. SQLite
+# has no FULLTEXT indexes, so there the messages get an external-content FTS5
+# table that triggers update on every insert, update and delete.
+SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, senderName, senderEmail, productName,
+        content='messages', content_rowid='message_id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, senderName, senderEmail, productName)
+        VALUES (new.message_id, new.content, new.senderName, new.senderEmail, new.productName);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, senderName, senderEmail, productName)
+        VALUES ('delete', old.message_id, old.content, old.senderName, old.senderEmail, old.productName);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, senderName, senderEmail, productName ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, senderName, senderEmail, productName)
+        VALUES ('delete', old.message_id, old.content, old.senderName, old.senderEmail, old.productName);
+        INSERT INTO messages_fts(rowid, content, senderName, senderEmail, productName)
+        VALUES (new.message_id, new.content, new.senderName, new.senderEmail, new.productName);
+    END""",
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Message.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+def create_search_index(engine):
+    """Create the SQLite FTS table for an existing database and index the messages already in it"""
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as connection:
+        for statement in SQLITE_FTS_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+
+def fts5_query(terms):
+    """Quote each search term for FTS5 and allow prefix matches; terms are ANDed"""
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+def search_messages(seller_id, query, limit, offset):
+    """Return ([(Message, score)], has_more) for one seller, best matches first"""
+    terms = re.findall(r'\w[\w@.\-]*', query)
+    if not terms:
+        return [], False
+
+    dialect = db.engine.dialect.name
+    messages = db.session.query(Message).filter(Message.seller_id == seller_id)
+
+    if dialect == 'mysql':
+        score = match(*[getattr(Message, column) for column in SEARCH_COLUMNS],
+                      against=' '.join(terms)).in_natural_language_mode()
+        messages = messages.add_columns(score.label('score')).filter(score > 0)
+        order = [db.desc('score'), Message.message_id.desc()]
+    elif dialect == 'sqlite':
+        # bm25() is lower for better matches; flip it so higher is better everywhere
+        score = db.literal_column('-bm25(messages_fts)')
+        messages = messages.join(
+            db.table('messages_fts'), db.literal_column('messages_fts.rowid') == Message.message_id
+        ).filter(db.literal_column('messages_fts').op('MATCH')(fts5_query(terms))).add_columns(score.label('score'))
+        order = [db.desc('score'), Message.message_id.desc()]
+    else:
+        # No full-text support: substring match on every column, newest first
+        for term in terms:
+            pattern = f"%{term}%"
+            messages = messages.filter(db.or_(*[getattr(Message, column).ilike(pattern) for column in SEARCH_COLUMNS]))
+        messages = messages.add_columns(db.literal(1.0).label('score'))
+        order = [Message.created_at.desc(), Message.message_id.desc()]
+
+    rows = messages.order_by(*order).offset(offset).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
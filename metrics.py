@@ -0,0 +1,185 @@
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from bisect import bisect_left
+import threading
+import time
+
+# Seconds; also used for DB time per request and outbound calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    return repr(float(value)) if not isinstance(value, int) else str(value)
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+
+    def __init__(self, name, documentation, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {str(e)}")
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(value)}"]
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time spent handling requests, by Flask endpoint',
+    ('endpoint', 'method', 'status'))
+REQUEST_SQL_STATEMENTS = Histogram(
+    'http_request_sql_statements', 'SQL statements executed per request',
+    ('endpoint',), SQL_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_seconds', 'Cumulative database time per request',
+    ('endpoint',))
+SQL_STATEMENTS = Counter('db_statements_total', 'SQL statements executed, by verb', ('verb',))
+SQL_TIME = Counter('db_statement_seconds_total', 'Time spent executing SQL statements, by verb', ('verb',))
+OUTBOUND_LATENCY = Histogram(
+    'outbound_request_duration_seconds', 'Outbound HTTP call latency',
+    ('service', 'operation', 'status'))
+
+REGISTRY = [REQUEST_LATENCY, REQUEST_SQL_STATEMENTS, REQUEST_DB_TIME, SQL_STATEMENTS, SQL_TIME, OUTBOUND_LATENCY]
+
+def register_gauge(name, documentation, read):
+    REGISTRY[:] = [metric for metric in REGISTRY if metric.name != name]
+    REGISTRY.append(Gauge(name, documentation, read))
+
+def observe_outbound(service, operation, status, seconds):
+    OUTBOUND_LATENCY.observe((service, operation, str(status)), seconds)
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    SQL_STATEMENTS.inc((verb,))
+    SQL_TIME.inc((verb,), elapsed)
+    if has_request_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # after_cursor_execute never fires for failed statements
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+def init_app(app):
+    """Time every request and expose all metrics at /metrics in Prometheus text format.
+
+    Metrics are kept per process; with several gunicorn workers each scrape
+    sees the worker that answered it.
+    """
+
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    # First in line, so requests answered by an earlier hook (e.g. a rate limiter 429) are timed too
+    app.before_request_funcs.setdefault(None, []).insert(0, start_timer)
+
+    def record(status):
+        started = g.pop('request_started', None)
+        # Without a start time the request still counts, with no latency
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        # Unmatched URLs share one label so random paths can't blow up the series count
+        endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe((endpoint, request.method, str(status)), elapsed)
+        REQUEST_SQL_STATEMENTS.observe((endpoint,), g.get('sql_statements', 0))
+        REQUEST_DB_TIME.observe((endpoint,), g.get('sql_seconds', 0.0))
+
+    @app.after_request
+    def record_request(response):
+        record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc=None):
+        # after_request is skipped when an exception escapes the request; its timer is still set
+        if 'request_started' in g:
+            record(500)
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
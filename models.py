@@ -1,8 +1,9 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,6 +15,11 @@ class User(db.Model):
     phone_number = db.Column(db.String(20), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     # User type is now always 'buyer' - removed user_type field
+    
+    __table_args__ = (
+        # Admin directory search by username prefix (email is already indexed as unique)
+        db.Index('ix_users_username', 'username'),
+    )
 
 class SellerProfile(db.Model):
     __tablename__ = 'seller_profile'
@@ -27,7 +33,14 @@ class SellerProfile(db.Model):
     approval_status = db.Column(db.String(20), default='pending', nullable=False)  # pending, approved, rejected
     phone_number = db.Column(db.String(20), nullable=True)
     approved_at = db.Column(db.DateTime, nullable=True)
+    # Denormalized so the inbox badge is a primary-key lookup; kept in step by the message routes
+    unread_message_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Admin approval queue (oldest first per status) and per-status counts
+        db.Index('ix_seller_profile_approval_created', 'approval_status', 'created_at'),
+    )
 
 class AdminProfile(db.Model):
     __tablename__ = 'admin_profile'
@@ -59,6 +72,15 @@ class Product(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class ProductFacet(db.Model):
+    """Product and in-stock counts per category and price bucket, kept in step by facets.py"""
+    __tablename__ = 'product_facets'
+    
+    category = db.Column(db.String(100), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True, autoincrement=False)  # index into facets.PRICE_BUCKETS
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    in_stock_count = db.Column(db.Integer, nullable=False, default=0)
+
 # New Order Models
 class Order(db.Model):
     __tablename__ = 'orders'
@@ -82,11 +104,18 @@ class Order(db.Model):
     payment_method = db.Column(db.String(50), default='mpesa', nullable=False)
     
     # M-Pesa details
-    mpesa_checkout_request_id = db.Column(db.String(100), nullable=True)
+    mpesa_checkout_request_id = db.Column(db.String(100), nullable=True, index=True)
     mpesa_receipt_number = db.Column(db.String(50), nullable=True)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Used by the payment reconciler to find stale pending payments
+        db.Index('ix_orders_payment_status_created_at', 'payment_status', 'created_at'),
+        # Covers the per-buyer order count and spend in the admin user directory
+        db.Index('ix_orders_user_payment_total', 'user_id', 'payment_status', 'total_amount'),
+    )
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
@@ -104,6 +133,11 @@ class OrderItem(db.Model):
     total_price = db.Column(db.Float, nullable=False)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Finding the orders that contain given products (recommendations.py)
+        db.Index('ix_order_items_product_order', 'product_id', 'order_id'),
+    )
 
 class Message(db.Model):
     __tablename__ = 'messages'
@@ -130,3 +164,60 @@ class Message(db.Model):
     
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Seller inbox keyset pagination (newest first)
+        db.Index('ix_messages_seller_created', 'seller_id', 'created_at'),
+        # Seller inbox search; SQLite uses the FTS5 table from message_search.py instead
+        db.Index('ix_messages_fulltext', 'content', 'senderName', 'senderEmail', 'productName',
+                 mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
+class Job(db.Model):
+    """Deferred work for the background job runner (see jobs.py)"""
+    __tablename__ = 'jobs'
+    
+    job_id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False, default='default')
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments for the task
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher runs first
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Claiming: the next due job of a queue by priority
+        db.Index('ix_jobs_claim', 'queue', 'status', 'priority', 'run_at'),
+        # Requeueing jobs whose worker died mid-run
+        db.Index('ix_jobs_status_locked_at', 'status', 'locked_at'),
+    )
+
+class ProductRecommendation(db.Model):
+    """Top related products per product ("frequently bought together"), built by recommendations.py"""
+    __tablename__ = 'product_recommendations'
+    
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 = most related
+    related_product_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)  # cosine similarity of the two products' order sets
+    co_orders = db.Column(db.Integer, nullable=False)  # orders containing both
+
+class RecommendationBuild(db.Model):
+    """One full or incremental recommendations build; the latest holds the order_items watermark"""
+    __tablename__ = 'recommendation_builds'
+    
+    build_id = db.Column(db.Integer, primary_key=True)
+    mode = db.Column(db.String(20), nullable=False)  # full, incremental
+    last_item_id = db.Column(db.Integer, nullable=False)  # highest order_items.item_id included
+    products = db.Column(db.Integer, nullable=False, default=0)  # products whose lists were rewritten
+    seconds = db.Column(db.Float, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=False)  # before last_item_id was read
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,411 @@
+from models import db, Order
+from routes.mpesa import TRANSACTIONS, query_stk_status
+from sqlalchemy import case
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+# Daraja answers STK queries for pushes the customer has not acted on yet with this error code
+STK_STILL_PROCESSING = '500.001.1001'
+
+def settle_payments(results):
+    """Apply payment outcomes to orders in bulk.
+
+    `results` maps CheckoutRequestID -> {'status': 'completed'|'failed', 'receipt': str|None}.
+    Only orders whose payment is still pending are touched, so settling the same
+    outcome twice is a no-op. Returns the number of order rows updated.
+    """
+    if not results:
+        return 0
+
+    now = datetime.utcnow()
+    updated = 0
+
+    for payment_status, order_status in (('completed', 'confirmed'), ('failed', 'cancelled')):
+        checkout_ids = [cid for cid, result in results.items() if result['status'] == payment_status]
+        if not checkout_ids:
+            continue
+
+        values = {
+            'payment_status': payment_status,
+            'status': order_status,
+            'updated_at': now
+        }
+        receipts = {cid: results[cid]['receipt'] for cid in checkout_ids if results[cid].get('receipt')}
+        if receipts:
+            values['mpesa_receipt_number'] = case(
+                receipts,
+                value=Order.mpesa_checkout_request_id,
+                else_=Order.mpesa_receipt_number
+            )
+
+        updated += Order.query.filter(
+            Order.mpesa_checkout_request_id.in_(checkout_ids),
+            Order.payment_status == 'pending'
+        ).update(values, synchronize_session=False)
+
+    db.session.commit()
+
+    # Keep the in-memory status endpoint in line with the database
+    for cid, result in results.items():
+        if cid in TRANSACTIONS:
+            TRANSACTIONS[cid]['status'] = result['status']
+            if result.get('result_code') is not None:
+                TRANSACTIONS[cid]['result_code'] = result['result_code']
+                TRANSACTIONS[cid]['result_desc'] = result.get('result_desc')
+
+    return updated
+
+class MpesaReconciler:
+    """Background worker that settles payments whose M-Pesa callback never arrived.
+
+    Every MPESA_RECONCILE_INTERVAL seconds it picks pending payments older than
+    MPESA_RECONCILE_MIN_AGE, asks the STK Query API for their result (at most
+    MPESA_QUERY_RATE calls per second, MPESA_RECONCILE_BATCH_SIZE per run) and
+    settles the answered ones with bulk updates.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # CheckoutRequestID -> (attempts, earliest time to query again)
+        self._backoff = {}
+        self._metrics = {
+            'runs': 0,
+            'queried': 0,
+            'settled_completed': 0,
+            'settled_failed': 0,
+            'query_errors': 0,
+            'pending_backlog': 0,
+            'oldest_pending_age_seconds': 0.0,
+            'last_settle_lag_seconds': 0.0,
+            'max_settle_lag_seconds': 0.0,
+            'last_run_at': None,
+            'last_run_duration_seconds': 0.0
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('MPESA_RECONCILE_INTERVAL', 60)
+        app.config.setdefault('MPESA_RECONCILE_MIN_AGE', 120)
+        app.config.setdefault('MPESA_RECONCILE_BATCH_SIZE', 20)
+        app.config.setdefault('MPESA_QUERY_RATE', 2)
+        app.extensions['mpesa_reconciler'] = self
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='mpesa-reconciler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                print(f"Payment reconciliation error: {str(e)}")
+            self._stop.wait(self.app.config['MPESA_RECONCILE_INTERVAL'])
+
+    def _pending_payments(self):
+        """Return [(checkout_request_id, created_at)] for stale pending payments, oldest first"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['MPESA_RECONCILE_MIN_AGE'])
+
+        pending = dict(db.session.query(Order.mpesa_checkout_request_id, Order.created_at).filter(
+            Order.payment_status == 'pending',
+            Order.mpesa_checkout_request_id.isnot(None),
+            Order.created_at <= cutoff
+        ).all())
+
+        # STK pushes that never turned into an order still show up on the status endpoint
+        local_cutoff = datetime.now() - timedelta(seconds=self.app.config['MPESA_RECONCILE_MIN_AGE'])
+        for cid, transaction in list(TRANSACTIONS.items()):
+            if cid in pending or transaction['status'] != 'pending':
+                continue
+            started = datetime.fromisoformat(transaction['timestamp'])
+            if started <= local_cutoff:
+                pending[cid] = started + (datetime.utcnow() - datetime.now())
+
+        return sorted(pending.items(), key=lambda item: item[1])
+
+    def run_once(self):
+        """Run one reconciliation pass; returns the number of orders settled"""
+        started = time.monotonic()
+        now = time.time()
+        pending = self._pending_payments()
+
+        # Forget backoff state for payments that were settled elsewhere
+        pending_ids = {cid for cid, _ in pending}
+        for cid in list(self._backoff):
+            if cid not in pending_ids:
+                del self._backoff[cid]
+
+        due = [(cid, created) for cid, created in pending
+               if self._backoff.get(cid, (0, 0))[1] <= now]
+        batch = due[:self.app.config['MPESA_RECONCILE_BATCH_SIZE']]
+        interval = 1.0 / self.app.config['MPESA_QUERY_RATE']
+
+        results = {}
+        created_at = dict(batch)
+        queried = errors = 0
+        for i, (cid, _) in enumerate(batch):
+            if self._stop.is_set():
+                break
+            if i:
+                time.sleep(interval)
+
+            response = query_stk_status(cid)
+            queried += 1
+            result_code = response.get('ResultCode')
+
+            if result_code is None:
+                if response.get('errorCode') != STK_STILL_PROCESSING:
+                    errors += 1
+                attempts = self._backoff.get(cid, (0, 0))[0] + 1
+                delay = min(self.app.config['MPESA_RECONCILE_INTERVAL'] * 2 ** attempts, 3600)
+                self._backoff[cid] = (attempts, time.time() + delay)
+                continue
+
+            results[cid] = {
+                'status': 'completed' if str(result_code) == '0' else 'failed',
+                'receipt': None,
+                'result_code': result_code,
+                'result_desc': response.get('ResultDesc')
+            }
+
+        settle_payments(results)
+
+        settled_at = datetime.utcnow()
+        lags = [(settled_at - created_at[cid]).total_seconds() for cid in results]
+        remaining = [created for cid, created in pending if cid not in results]
+
+        with self._lock:
+            m = self._metrics
+            m['runs'] += 1
+            m['queried'] += queried
+            m['query_errors'] += errors
+            m['settled_completed'] += sum(1 for r in results.values() if r['status'] == 'completed')
+            m['settled_failed'] += sum(1 for r in results.values() if r['status'] == 'failed')
+            m['pending_backlog'] = len(remaining)
+            m['oldest_pending_age_seconds'] = (settled_at - remaining[0]).total_seconds() if remaining else 0.0
+            if lags:
+                m['last_settle_lag_seconds'] = max(lags)
+                m['max_settle_lag_seconds'] = max(m['max_settle_lag_seconds'], max(lags))
+            m['last_run_at'] = settled_at.isoformat()
+            m['last_run_duration_seconds'] = time.monotonic() - started
+
+        return len(results)
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics)
+
+class CallbackWriter:
+    """Applies M-Pesa callbacks to the database in micro-batches.
+
+    The callback route only validates and enqueues; a single writer thread
+    drains the queue and commits up to MPESA_CALLBACK_BATCH_SIZE outcomes at
+    a time (waiting at most MPESA_CALLBACK_FLUSH_INTERVAL seconds to fill a
+    batch), so callback bursts hold one DB connection instead of one per
+    request. Safaricom retries are dropped by remembering recently seen
+    (CheckoutRequestID, ResultCode) pairs.
+
+    Callbacks are acknowledged before they are written, so Safaricom never
+    resends one whose batch fails. A failed batch is appended to this
+    process's spool file next to MPESA_CALLBACK_SPOOL_PATH and retried with
+    exponential backoff; spools left by exited processes are picked up when
+    the writer starts.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()
+        self._failures = 0
+        self._retry_at = None  # monotonic time the spool is due for another attempt
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('MPESA_CALLBACK_BATCH_SIZE', 100)
+        app.config.setdefault('MPESA_CALLBACK_FLUSH_INTERVAL', 0.5)
+        app.config.setdefault('MPESA_CALLBACK_QUEUE_SIZE', 10000)
+        app.config.setdefault('MPESA_CALLBACK_DEDUPE_SIZE', 100000)
+        app.config.setdefault('MPESA_CALLBACK_RETRY_BASE', 1.0)
+        app.config.setdefault('MPESA_CALLBACK_RETRY_MAX', 60.0)
+        app.config.setdefault('MPESA_CALLBACK_SPOOL_PATH', os.path.join(app.instance_path, 'mpesa_callback_spool.jsonl'))
+        self._queue = queue.Queue(app.config['MPESA_CALLBACK_QUEUE_SIZE'])
+        app.extensions['mpesa_callback_writer'] = self
+
+    def submit(self, checkout_request_id, result_code, receipt=None, result_desc=None):
+        """Queue a callback outcome; returns 'queued', 'duplicate' or 'busy'"""
+        key = (checkout_request_id, str(result_code))
+        with self._lock:
+            if key in self._seen:
+                return 'duplicate'
+            self._seen[key] = True
+            if len(self._seen) > self.app.config['MPESA_CALLBACK_DEDUPE_SIZE']:
+                self._seen.popitem(last=False)
+
+        try:
+            self._queue.put_nowait({
+                'checkout_request_id': checkout_request_id,
+                'status': 'completed' if str(result_code) == '0' else 'failed',
+                'receipt': receipt,
+                'result_code': result_code,
+                'result_desc': result_desc
+            })
+        except queue.Full:
+            # Let Safaricom retry later instead of losing the callback
+            self._forget([key])
+            return 'busy'
+
+        self.start()
+        return 'queued'
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            if self._spools(adopt=True):
+                self._retry_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name='mpesa-callback-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Flush everything queued so far and stop the writer thread"""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _forget(self, keys):
+        with self._lock:
+            for key in keys:
+                self._seen.pop(key, None)
+
+    def _next_batch(self):
+        """Block for the first item, then collect more until the batch is full or the flush interval passes"""
+        # Wake up for a due spool retry even if no callbacks arrive
+        timeout = None if self._retry_at is None else max(self._retry_at - time.monotonic(), 0)
+        try:
+            first = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return [], False
+        if first is None:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.app.config['MPESA_CALLBACK_FLUSH_INTERVAL']
+        while len(batch) < self.app.config['MPESA_CALLBACK_BATCH_SIZE']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            batch = batch or []
+            if self._retry_at is not None and (stopping or time.monotonic() >= self._retry_at):
+                try:
+                    batch = self._replay_spool() + batch
+                except Exception as e:
+                    print(f"Error replaying callback spool: {str(e)}")
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        # Later callbacks for the same checkout override earlier ones within a batch
+        results = {item['checkout_request_id']: item for item in batch}
+        try:
+            with self.app.app_context():
+                settle_payments(results)
+        except Exception as e:
+            print(f"Callback batch write error: {str(e)}")
+            with self.app.app_context():
+                db.session.rollback()
+            # Already acknowledged, so Safaricom won't resend: keep the outcomes and try again later
+            self._spool(list(results.values()))
+            self._failures += 1
+            delay = min(self.app.config['MPESA_CALLBACK_RETRY_BASE'] * 2 ** (self._failures - 1),
+                        self.app.config['MPESA_CALLBACK_RETRY_MAX'])
+            self._retry_at = time.monotonic() + delay
+        else:
+            self._failures = 0
+
+    def _spool_path(self):
+        # One spool per process: gunicorn workers share MPESA_CALLBACK_SPOOL_PATH
+        root, ext = os.path.splitext(self.app.config['MPESA_CALLBACK_SPOOL_PATH'])
+        return f"{root}.{os.getpid()}{ext}"
+
+    def _spool(self, items):
+        path = self._spool_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as spool:
+            for item in items:
+                spool.write(json.dumps(item) + '\n')
+        print(f"Spooled {len(items)} M-Pesa callbacks to {path}")
+
+    def _spools(self, adopt=False):
+        """This process's spool if it exists; with adopt, also those of exited processes"""
+        paths = [self._spool_path()]
+        if adopt:
+            root, ext = os.path.splitext(self.app.config['MPESA_CALLBACK_SPOOL_PATH'])
+            for path in glob.glob(f"{glob.escape(root)}.*{ext}"):
+                pid = path[len(root) + 1:len(path) - len(ext)]
+                if not pid.isdigit() or int(pid) == os.getpid():
+                    continue
+                try:
+                    os.kill(int(pid), 0)
+                except ProcessLookupError:
+                    paths.append(path)
+                except OSError:
+                    pass  # alive, owned by another user
+        return [path for path in paths if os.path.exists(path)]
+
+    def _replay_spool(self):
+        """Take spooled outcomes back for another attempt"""
+        items = []
+        replay = self._spool_path() + '.replay'
+        for path in self._spools(adopt=True):
+            try:
+                # Claim the file first so no other process replays it too
+                os.replace(path, replay)
+            except FileNotFoundError:
+                continue
+            with open(replay) as spool:
+                for line in spool:
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        print(f"Skipping unreadable line in callback spool {path}")
+            os.remove(replay)
+        self._retry_at = None
+        return items
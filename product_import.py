@@ -0,0 +1,150 @@
+from models import db, Product
+from facets import FacetDeltas
+import csv
+import io
+import json
+import math
+import os
+import time
+
+IMPORT_FORMATS = {
+    'csv': 'csv',
+    'jsonl': 'jsonl',
+    'ndjson': 'jsonl',
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+# Longest values the products columns take
+MAX_LENGTHS = {'name': 255, 'category': 100, 'image_url': 255}
+
+def detect_format(requested=None, filename=None, mimetype=None):
+    """'csv' or 'jsonl' from an explicit ?format=, the file extension or the content type"""
+    extension = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    for candidate in (requested, extension, mimetype):
+        if candidate and candidate.lower() in IMPORT_FORMATS:
+            return IMPORT_FORMATS[candidate.lower()]
+    return None
+
+def read_rows(stream, import_format):
+    """Yield (row number, dict or None, error or None) from a binary stream, one line at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if import_format == 'csv' else None)
+    if import_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Header is line 1, so rows are numbered as a spreadsheet shows them
+            yield reader.line_num, row, None
+        return
+
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'Invalid JSON: {str(e)}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Each line must be a JSON object'
+            continue
+        yield number, row, None
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+def validate_row(row, seller_id):
+    """Return (products column values, None) for a valid row, or (None, error message)"""
+    values = {'seller_id': seller_id}
+    for field in ('name', 'description', 'category'):
+        values[field] = _text(row, field)
+        if not values[field]:
+            return None, f'{field} is required'
+    # The single-product form calls the column `image`
+    values['image_url'] = _text(row, 'image_url') or _text(row, 'image') or None
+
+    for field, limit in MAX_LENGTHS.items():
+        if values[field] and len(values[field]) > limit:
+            return None, f'{field} is longer than {limit} characters'
+
+    try:
+        values['price'] = float(_text(row, 'price'))
+    except ValueError:
+        return None, 'price must be a number'
+    if not math.isfinite(values['price']) or values['price'] < 0:
+        return None, 'price must be zero or more'
+
+    stock = _text(row, 'stock') or '0'
+    try:
+        values['stock'] = int(stock)
+    except ValueError:
+        return None, 'stock must be a whole number'
+    if values['stock'] < 0:
+        return None, 'stock must be zero or more'
+
+    return values, None
+
+def import_products(rows, seller_id, batch_size=500, max_rows=None, max_errors=100):
+    """Validate `rows` (from read_rows) and insert the valid ones for `seller_id`.
+
+    Valid rows are inserted batch_size at a time with one multi-row INSERT
+    and committed per batch, so a long file holds no locks for its whole
+    length and memory stays flat. If a batch is rejected by the database its
+    rows are retried one by one, so only the offending rows fail. Returns
+    counts, the first `max_errors` row errors and the throughput.
+    """
+    started = time.perf_counter()
+    summary = {'imported': 0, 'failed': 0, 'errors': [], 'aborted': None}
+    batch = []
+
+    def fail(number, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < max_errors:
+            summary['errors'].append({'row': number, 'message': message})
+
+    def insert(chunk):
+        db.session.execute(Product.__table__.insert(), chunk)
+        facets = FacetDeltas()
+        for values in chunk:
+            facets.add(values['category'], values['price'], values['stock'])
+        facets.apply()
+        db.session.commit()
+
+    def flush():
+        try:
+            insert([values for number, values in batch])
+            summary['imported'] += len(batch)
+        except Exception:
+            db.session.rollback()
+            for number, values in batch:
+                try:
+                    insert([values])
+                    summary['imported'] += 1
+                except Exception as e:
+                    db.session.rollback()
+                    fail(number, f'Could not be saved: {str(getattr(e, "orig", e))}')
+        batch.clear()
+
+    seen = 0
+    try:
+        for number, row, error in rows:
+            seen += 1
+            if max_rows and seen > max_rows:
+                summary['aborted'] = f'Stopped after {max_rows} rows; split the file and import the rest separately'
+                break
+            if error is None:
+                values, error = validate_row(row, seller_id)
+            if error:
+                fail(number, error)
+                continue
+            batch.append((number, values))
+            if len(batch) >= batch_size:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        summary['aborted'] = f'Stopped reading the file after {seen} rows: {str(e)}'
+    if batch:
+        flush()
+
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    summary['rowsPerSecond'] = round(summary['imported'] / max(summary['seconds'], 1e-3))
+    return summary
@@ -0,0 +1,180 @@
+from flask import g, request, session
+from collections import Counter
+from datetime import datetime
+import cProfile
+import hashlib
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+
+# Signed profile requests are accepted for this many seconds after their timestamp
+SIGNATURE_MAX_AGE = 300
+
+def sign_profile_request(secret, method, path, timestamp=None):
+    """Value for the X-Profile-Signature header, e.g. from an operator's shell"""
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    digest = hmac.new(secret.encode('utf-8'), f"{timestamp}:{method}:{path}".encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"{timestamp}:{digest}"
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as out:
+            for stack, count in self.stacks.most_common():
+                out.write(f"{stack} {count}\n")
+
+class RequestProfiler:
+    """Profiles individual requests on demand.
+
+    A request is profiled when an admin session sends `X-Profile: 1`, when
+    it carries a valid `X-Profile-Signature` (see sign_profile_request;
+    needs PROFILE_SECRET), or when it wins the 1-in-N draw configured for its
+    endpoint in PROFILE_SAMPLE_RATES. PROFILE_MODE picks cProfile output
+    (.prof, readable with pstats/snakeviz) or a sampling profiler writing
+    collapsed stacks (.collapsed, for flamegraph.pl/speedscope). Only the
+    newest PROFILE_KEEP files are kept in PROFILE_DIR.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.keep = 200
+        self.mode = 'cprofile'
+        self.sample_interval = 0.005
+        self.sample_rates = {}
+        self.secret = None
+        self._rotate_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILE_KEEP', 200)
+        app.config.setdefault('PROFILE_MODE', 'cprofile')
+        app.config.setdefault('PROFILE_SAMPLE_INTERVAL', 0.005)
+        app.config.setdefault('PROFILE_SAMPLE_RATES', {})
+        app.config.setdefault('PROFILE_SECRET', None)
+        self.directory = app.config['PROFILE_DIR']
+        self.keep = app.config['PROFILE_KEEP']
+        self.mode = app.config['PROFILE_MODE']
+        self.sample_interval = app.config['PROFILE_SAMPLE_INTERVAL']
+        self.sample_rates = app.config['PROFILE_SAMPLE_RATES']
+        self.secret = app.config['PROFILE_SECRET']
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._abandon)
+        app.extensions['request_profiler'] = self
+
+    def should_profile(self):
+        if request.headers.get('X-Profile') == '1' and 'admin_id' in session:
+            return True
+        signature = request.headers.get('X-Profile-Signature')
+        if signature and self.secret and self._valid_signature(signature):
+            return True
+        rate = self.sample_rates.get(request.endpoint)
+        return bool(rate) and random.randrange(rate) == 0
+
+    def _valid_signature(self, signature):
+        timestamp, _, _ = signature.partition(':')
+        if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > SIGNATURE_MAX_AGE:
+            return False
+        expected = sign_profile_request(self.secret, request.method, request.path, timestamp)
+        return hmac.compare_digest(signature, expected)
+
+    def _start(self):
+        if not self.should_profile():
+            return
+        if self.mode == 'sample':
+            profiler = StackSampler(threading.get_ident(), self.sample_interval)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another request in this process is already being profiled
+                return
+        g.profiler = profiler
+        g.profile_started = time.perf_counter()
+
+    def _stop(self, profiler):
+        if isinstance(profiler, StackSampler):
+            profiler.stop()
+        else:
+            profiler.disable()
+
+    def _finish(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        self._stop(profiler)
+        elapsed_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+        try:
+            name = self._write(profiler, elapsed_ms)
+            response.headers['X-Profile-File'] = name
+        except Exception as e:
+            print(f"Error writing request profile: {str(e)}")
+        return response
+
+    def _abandon(self, exc):
+        # after_request is skipped when the view raised; don't leave the profiler running
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            self._stop(profiler)
+
+    def _write(self, profiler, elapsed_ms):
+        os.makedirs(self.directory, exist_ok=True)
+        endpoint = request.endpoint or 'unmatched'
+        extension = 'collapsed' if isinstance(profiler, StackSampler) else 'prof'
+        name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{endpoint}-{elapsed_ms:.0f}ms.{extension}"
+        path = os.path.join(self.directory, name)
+        if isinstance(profiler, StackSampler):
+            profiler.dump(path)
+        else:
+            profiler.dump_stats(path)
+        self._rotate()
+        return name
+
+    def _rotate(self):
+        with self._rotate_lock:
+            names = sorted(self.profiles())
+            for name in names[:max(len(names) - self.keep, 0)]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def profiles(self):
+        """Profile file names, oldest first (names start with a UTC timestamp)"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(('.prof', '.collapsed')))
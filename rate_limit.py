@@ -0,0 +1,206 @@
+from flask import jsonify, request, session
+from collections import OrderedDict
+import math
+import re
+import threading
+import time
+import uuid
+import metrics
+
+# Per-endpoint limits. Scopes: `ip` (client address), `session` (browser
+# session), `account` (the `account_field` of the JSON body, e.g. the email
+# being logged in to). A limit "N/period" allows bursts of N and refills at
+# N per period.
+DEFAULT_RATE_LIMITS = {
+    'api.login': {'ip': '20/minute', 'account': '5/minute', 'account_field': 'email'},
+    'api.seller_login': {'ip': '20/minute', 'account': '5/minute', 'account_field': 'email'},
+    'api.admin_login': {'ip': '10/minute', 'account': '5/minute', 'account_field': 'email'},
+    'mpesa.initiate_stk_push': {'ip': '10/minute', 'session': '5/minute', 'account': '3/minute',
+                                'account_field': 'phoneNumber'},
+    'api.send_message': {'ip': '5/25s', 'account': '5/25s', 'account_field': 'senderEmail'},
+}
+
+SCOPES = ('ip', 'session', 'account')
+_PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60, 'h': 3600, 'hour': 3600}
+_LIMIT = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+?)s?\s*$')
+
+REJECTED = metrics.Counter('rate_limited_requests_total', 'Requests rejected by the rate limiter', ('endpoint',))
+metrics.REGISTRY.append(REJECTED)
+
+def parse_limit(limit):
+    """Parse "5/minute" or "5/25s" into (rate per second, capacity)"""
+    match = _LIMIT.match(limit)
+    if not match or match.group(3) not in _PERIODS:
+        raise ValueError(f"Invalid rate limit: {limit!r}")
+    count = int(match.group(1))
+    period = int(match.group(2) or 1) * _PERIODS[match.group(3)]
+    return count / period, count
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now=None):
+        now = now if now is not None else time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = now
+
+    def retry_after(self):
+        return (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+
+class MemoryStore:
+    """Token buckets in this process, evicting the least recently used beyond `max_keys`"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, limits):
+        """Take a token from each (key, rate, capacity) if all have one; returns seconds to wait, 0 if taken"""
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for key, rate, capacity in limits:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(rate, capacity)
+                    if len(self._buckets) > self.max_keys:
+                        self._buckets.popitem(last=False)
+                else:
+                    self._buckets.move_to_end(key)
+                bucket.refill(now)
+                buckets.append(bucket)
+            # A rejected request costs nothing, so it can't drain the other scopes' quotas
+            wait = max((bucket.retry_after() for bucket in buckets), default=0)
+            if not wait:
+                for bucket in buckets:
+                    bucket.tokens -= 1
+        return wait
+
+class RedisStore:
+    """Token buckets shared by every worker through Redis (needs the `redis` package)"""
+
+    # KEYS: bucket keys; ARGV: rate, capacity pairs. Uses the Redis clock so workers agree.
+    SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local wait = 0
+    local tokens = {}
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[i * 2 - 1])
+        local capacity = tonumber(ARGV[i * 2])
+        local state = redis.call('HMGET', key, 'tokens', 'updated')
+        local updated = tonumber(state[2]) or now
+        tokens[i] = math.min(capacity, (tonumber(state[1]) or capacity) + (now - updated) * rate)
+        if tokens[i] < 1 then
+            wait = math.max(wait, (1 - tokens[i]) / rate)
+        end
+    end
+    -- Only take tokens when every bucket has one
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[i * 2 - 1])
+        local capacity = tonumber(ARGV[i * 2])
+        if wait == 0 then
+            tokens[i] = tokens[i] - 1
+        end
+        redis.call('HSET', key, 'tokens', tokens[i], 'updated', now)
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    end
+    return tostring(wait)
+    """
+
+    def __init__(self, url, prefix='kukuhub:ratelimit:'):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+        self._prefix = prefix
+
+    def take(self, limits):
+        keys = [f"{self._prefix}{key}" for key, rate, capacity in limits]
+        args = [value for key, rate, capacity in limits for value in (rate, capacity)]
+        return float(self._script(keys=keys, args=args))
+
+class RateLimiter:
+    """Applies RATE_LIMITS to matching endpoints before they run.
+
+    Every scope configured for an endpoint takes a token from its own
+    bucket; if any bucket is empty the request gets a 429 with Retry-After.
+    Buckets live in this process unless RATE_LIMIT_STORAGE_URL points at
+    Redis, which multi-worker deployments need for limits to be global. If
+    the shared store is unreachable requests are let through. Behind a load
+    balancer set TRUSTED_PROXIES, or every client shares the proxy's `ip`
+    bucket.
+    """
+
+    def __init__(self, app=None, store=None):
+        self.store = store
+        self.enabled = True
+        self._limits = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_STORAGE_URL', None)
+        app.config.setdefault('RATE_LIMIT_MAX_KEYS', 100000)
+        app.config.setdefault('RATE_LIMITS', DEFAULT_RATE_LIMITS)
+        self.enabled = app.config['RATE_LIMIT_ENABLED']
+
+        self._limits = {}
+        for endpoint, rules in app.config['RATE_LIMITS'].items():
+            self._limits[endpoint] = {
+                'account_field': rules.get('account_field'),
+                'scopes': [(scope, *parse_limit(rules[scope])) for scope in SCOPES if rules.get(scope)]
+            }
+
+        if self.store is None:
+            if app.config['RATE_LIMIT_STORAGE_URL']:
+                self.store = RedisStore(app.config['RATE_LIMIT_STORAGE_URL'])
+            else:
+                self.store = MemoryStore(app.config['RATE_LIMIT_MAX_KEYS'])
+        app.before_request(self._check)
+        app.extensions['rate_limiter'] = self
+
+    def _key(self, scope, account_field):
+        if scope == 'ip':
+            # The client's address when TRUSTED_PROXIES is set (see create_app); otherwise the proxy's
+            return request.remote_addr
+        if scope == 'session':
+            # Anonymous visitors get an ID in their session cookie the first time they hit a limited route
+            return session.setdefault('rate_limit_id', uuid.uuid4().hex)
+        data = request.get_json(silent=True)
+        value = data.get(account_field) if isinstance(data, dict) and account_field else None
+        return str(value).strip().lower() if value else None
+
+    def _check(self):
+        config = self._limits.get(request.endpoint)
+        if not self.enabled or config is None:
+            return None
+
+        limits = []
+        for scope, rate, capacity in config['scopes']:
+            key = self._key(scope, config['account_field'])
+            if key:
+                limits.append((f"{request.endpoint}:{scope}:{key}", rate, capacity))
+        try:
+            wait = self.store.take(limits)
+        except Exception as e:
+            print(f"Rate limit store error, allowing request: {str(e)}")
+            return None
+        if not wait:
+            return None
+
+        REJECTED.inc((request.endpoint,))
+        response = jsonify({'success': False, 'message': 'Too many requests, please try again shortly'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+        return response
@@ -0,0 +1,212 @@
+"""Precomputed "frequently bought together" lists from order_items.
+
+    python recommendations.py                # full rebuild
+    python recommendations.py --incremental  # only what recent orders changed
+
+Two products are related by the cosine similarity of the sets of orders
+containing them: co_orders / sqrt(orders_a * orders_b). The top
+RECOMMEND_TOP_K per product are stored in product_recommendations, so
+serving them is a primary-key range read. New orders queue a debounced
+`refresh_recommendations` job that rescores only the affected products.
+Orders whose transaction stays open longer than RECOMMEND_REFRESH_OVERLAP
+are only picked up by the next full rebuild, so run one periodically
+(e.g. nightly from cron).
+"""
+from flask import current_app
+from models import db, OrderItem, ProductRecommendation, RecommendationBuild
+from jobs import enqueue, task
+from datetime import datetime, timedelta
+from itertools import chain
+import time
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional; only building needs them, serving does not
+    np = sparse = None
+
+# Rows fetched per round trip while loading order lines, and rows per INSERT when saving
+LOAD_BATCH_SIZE = 50000
+SAVE_BATCH_SIZE = 5000
+# Products per IN list when counting orders
+COUNT_BATCH_SIZE = 1000
+
+def related_products(lines, targets=None, count_orders=None, top_k=10, min_co_orders=1):
+    """Score related products for `targets` from (order_id, product_id) `lines`.
+
+    `lines` must hold every order containing a target. Order counts of the
+    other products come from `count_orders(product_ids)` when given, since
+    `lines` may only hold some of their orders; otherwise from `lines`.
+    Returns parallel arrays (product_id, rank, related_id, score, co_orders).
+    """
+    orders, order_index = np.unique(lines[:, 0], return_inverse=True)
+    products, product_index = np.unique(lines[:, 1], return_inverse=True)
+    # Orders x products, 1 where the order contains the product (duplicates collapse to 1)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(lines), dtype=np.float32), (order_index, product_index)),
+        shape=(len(orders), len(products))
+    )
+    incidence.data[:] = 1
+
+    if targets is None:
+        target_columns = np.arange(len(products))
+    else:
+        target_columns = np.intersect1d(products, targets, assume_unique=True, return_indices=True)[1]
+
+    if count_orders is None:
+        order_counts = np.asarray(incidence.sum(axis=0), dtype=np.float64).ravel()
+    else:
+        order_counts = count_orders(products)
+
+    # targets x products co-occurrence counts in one sparse product
+    co = (incidence[:, target_columns].T @ incidence).tocoo()
+    rows, columns, co_orders = co.row, co.col, co.data.astype(np.int64)
+    keep = (target_columns[rows] != columns) & (co_orders >= min_co_orders)
+    rows, columns, co_orders = rows[keep], columns[keep], co_orders[keep]
+    scores = co_orders / np.sqrt(order_counts[target_columns[rows]] * order_counts[columns])
+
+    # Best first within each target (ties by product id), then keep the first top_k of each
+    order = np.lexsort((columns, -scores, rows))
+    rows, columns, scores, co_orders = rows[order], columns[order], scores[order], co_orders[order]
+    ranks = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+    keep = ranks < top_k
+    return (products[target_columns[rows[keep]]], ranks[keep], products[columns[keep]],
+            scores[keep], co_orders[keep])
+
+def _load_lines(statement):
+    result = db.session.execute(statement.execution_options(yield_per=LOAD_BATCH_SIZE))
+    return np.fromiter(chain.from_iterable(result), dtype=np.int64).reshape(-1, 2)
+
+def _order_counter(max_item_id):
+    def count_orders(product_ids):
+        counts = {}
+        for start in range(0, len(product_ids), COUNT_BATCH_SIZE):
+            chunk = [int(product_id) for product_id in product_ids[start:start + COUNT_BATCH_SIZE]]
+            counts.update(db.session.query(
+                OrderItem.product_id, db.func.count(db.distinct(OrderItem.order_id))
+            ).filter(OrderItem.product_id.in_(chunk), OrderItem.item_id <= max_item_id).group_by(OrderItem.product_id))
+        return np.array([counts.get(int(product_id), 0) for product_id in product_ids], dtype=np.float64)
+    return count_orders
+
+def build_recommendations(full=False, top_k=None, min_co_orders=None):
+    """Rebuild product_recommendations, incrementally from earlier builds' watermarks unless `full`.
+
+    An incremental build rescores the products in orders added since the
+    rescan point and every product sharing an order with them (their scores
+    move with the new order counts), reading only the orders that contain
+    those products. Returns the RecommendationBuild recorded, or None if
+    there was nothing to rescore.
+
+    Auto-increment ids are handed out on insert, not commit, so an order
+    whose transaction was still open during a build sits below that build's
+    watermark. Each build therefore rescans from the watermark of a build
+    that started RECOMMEND_REFRESH_OVERLAP seconds before the latest one,
+    which catches any order committed within that many seconds.
+    """
+    if np is None:
+        raise RuntimeError('Building recommendations needs numpy and scipy (pip install numpy scipy)')
+    top_k = top_k or current_app.config['RECOMMEND_TOP_K']
+    min_co_orders = min_co_orders or current_app.config['RECOMMEND_MIN_CO_ORDERS']
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+
+    latest = db.session.query(RecommendationBuild.started_at).order_by(RecommendationBuild.build_id.desc()).first()
+    max_item_id = db.session.query(db.func.max(OrderItem.item_id)).scalar() or 0
+    if latest is None:
+        full = True
+    if not full:
+        overlap = timedelta(seconds=current_app.config['RECOMMEND_REFRESH_OVERLAP'])
+        rescan_from = db.session.query(db.func.max(RecommendationBuild.last_item_id)).filter(
+            RecommendationBuild.started_at <= latest.started_at - overlap
+        ).scalar() or 0
+        # No build is old enough to trust yet, so the rescan would cover every line anyway
+        if not rescan_from:
+            full = True
+
+    lines_query = db.select(OrderItem.order_id, OrderItem.product_id).where(OrderItem.item_id <= max_item_id)
+    if full:
+        lines = _load_lines(lines_query)
+        targets, count_orders = None, None
+    else:
+        new_products = db.select(OrderItem.product_id).where(
+            OrderItem.item_id > rescan_from, OrderItem.item_id <= max_item_id
+        )
+        affected_orders = db.select(OrderItem.order_id).where(OrderItem.product_id.in_(new_products))
+        targets = np.array(sorted(product_id for (product_id,) in db.session.execute(
+            db.select(OrderItem.product_id).where(OrderItem.order_id.in_(affected_orders)).distinct()
+        )), dtype=np.int64)
+        if not len(targets):
+            return None
+        target_orders = db.select(OrderItem.order_id).where(OrderItem.product_id.in_([int(t) for t in targets]))
+        lines = _load_lines(lines_query.where(OrderItem.order_id.in_(target_orders)))
+        count_orders = _order_counter(max_item_id)
+
+    if len(lines):
+        product_ids, ranks, related_ids, scores, co_orders = related_products(
+            lines, targets, count_orders, top_k=top_k, min_co_orders=min_co_orders
+        )
+    else:
+        product_ids = ranks = related_ids = scores = co_orders = []
+
+    try:
+        if full:
+            db.session.query(ProductRecommendation).delete(synchronize_session=False)
+        else:
+            for start in range(0, len(targets), COUNT_BATCH_SIZE):
+                chunk = [int(t) for t in targets[start:start + COUNT_BATCH_SIZE]]
+                db.session.query(ProductRecommendation).filter(
+                    ProductRecommendation.product_id.in_(chunk)
+                ).delete(synchronize_session=False)
+        rows = [
+            {'product_id': int(p), 'rank': int(r), 'related_product_id': int(q), 'score': float(s), 'co_orders': int(c)}
+            for p, r, q, s, c in zip(product_ids, ranks, related_ids, scores, co_orders)
+        ]
+        for start in range(0, len(rows), SAVE_BATCH_SIZE):
+            db.session.execute(ProductRecommendation.__table__.insert(), rows[start:start + SAVE_BATCH_SIZE])
+        build = RecommendationBuild(
+            mode='full' if full else 'incremental',
+            last_item_id=max_item_id,
+            started_at=started_at,
+            products=len(np.unique(lines[:, 1])) if full else len(targets),
+            seconds=round(time.perf_counter() - started, 3)
+        )
+        db.session.add(build)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return build
+
+@task(queue='default', priority=-10, max_attempts=3)
+def refresh_recommendations(full=False):
+    """Job form of build_recommendations, queued (debounced) by new orders"""
+    if np is None:
+        print('Skipping recommendations refresh: numpy and scipy are not installed')
+        return
+    watermark = db.session.query(db.func.max(RecommendationBuild.last_item_id)).scalar()
+    build = build_recommendations(full=full)
+    if build is None:
+        return
+    print(f"Recommendations {build.mode} build: {build.products} products in {build.seconds}s")
+    if watermark is None or build.last_item_id > watermark:
+        # Orders still open during this build may have had their own refresh debounced into it;
+        # one more pass once they have committed picks them up through the rescan overlap
+        enqueue('refresh_recommendations', delay=current_app.config['RECOMMEND_REFRESH_OVERLAP'], unique=True)
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Build "frequently bought together" recommendations')
+    parser.add_argument('--incremental', action='store_true', help='only rescore products touched by recent orders')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        build = build_recommendations(full=not args.incremental)
+        if build is None:
+            print('No recent orders to rescore')
+        else:
+            print(f"{build.mode.capitalize()} build: {build.products} products rescored in {build.seconds}s "
+                  f"(order items up to {build.last_item_id})")
@@ -1,10 +1,12 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import requests
 import base64
 from datetime import datetime
 import json
 import socket
+import time
+from metrics import observe_outbound
 
 mpesa_routes = Blueprint('mpesa', __name__)
 
@@ -19,6 +21,11 @@ CALLBACK_URL = "http://localhost:5000/api/mpesa/callback"  # Local development c
 API_BASE_URL = "https://sandbox.safaricom.co.ke"
 AUTH_ENDPOINT = "/oauth/v1/generate"
 STK_PUSH_ENDPOINT = "/mpesa/stkpush/v1/processrequest"
+STK_QUERY_ENDPOINT = "/mpesa/stkpushquery/v1/query"
+
+# Access tokens are valid for an hour; refresh a little early
+TOKEN_EXPIRY_MARGIN = 60
+_token_cache = {'access_token': None, 'expires_at': 0}
 
 # Store transaction details in memory (in a real app, you'd use a database)
 TRANSACTIONS = {}
@@ -64,8 +71,7 @@ def initiate_stk_push():
         # Prepare timestamp
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         
-        # Generate password - format: BusinessShortCode+Passkey+Timestamp
-        password = base64.b64encode(f"{BUSINESS_SHORT_CODE}{PASSKEY}{timestamp}".encode()).decode('utf-8')
+        password = generate_password(timestamp)
         
         # Prepare STK push request
         stk_request = {
@@ -84,7 +90,8 @@ def initiate_stk_push():
         
         # Make request to M-Pesa API
         try:
-            response = requests.post(
+            response = daraja_request(
+                'POST', 'stkpush',
                 f"{API_BASE_URL}{STK_PUSH_ENDPOINT}",
                 json=stk_request,
                 headers={
@@ -160,19 +167,37 @@ def check_payment_status(checkout_request_id):
 
 @mpesa_routes.route('/callback', methods=['POST'])
 def mpesa_callback():
-    """Callback endpoint for M-Pesa to send payment results"""
+    """Callback endpoint for M-Pesa to send payment results.
+
+    Validates and deduplicates the callback, then hands it to the callback
+    writer and acknowledges straight away; the order update is committed
+    in the writer's next micro-batch.
+    """
     try:
-        data = request.json
+        data = request.get_json(silent=True) or {}
         
         # Process callback data
         body = data.get('Body', {})
         stkCallback = body.get('stkCallback', {})
         checkout_request_id = stkCallback.get('CheckoutRequestID')
+        result_code = stkCallback.get('ResultCode')
         
-        if checkout_request_id in TRANSACTIONS:
-            result_code = stkCallback.get('ResultCode')
-            
-            if result_code == 0:
+        if not checkout_request_id or result_code is None:
+            return jsonify({'ResultCode': 1, 'ResultDesc': 'Rejected'}), 400
+        
+        receipt_number = None
+        for item in stkCallback.get('CallbackMetadata', {}).get('Item', []):
+            if item.get('Name') == 'MpesaReceiptNumber':
+                receipt_number = item.get('Value')
+        
+        writer = current_app.extensions['mpesa_callback_writer']
+        outcome = writer.submit(checkout_request_id, result_code, receipt_number, stkCallback.get('ResultDesc'))
+        if outcome == 'busy':
+            return jsonify({'ResultCode': 1, 'ResultDesc': 'Busy, retry later'}), 503
+        
+        # Only the first delivery of an outcome updates the in-memory status
+        if outcome == 'queued' and checkout_request_id in TRANSACTIONS:
+            if str(result_code) == '0':
                 # Payment successful
                 TRANSACTIONS[checkout_request_id]['status'] = 'completed'
             else:
@@ -187,12 +212,31 @@ def mpesa_callback():
         print(f"Callback processing error: {str(e)}")
         return jsonify({'ResultCode': 1, 'ResultDesc': 'Rejected'}), 500
 
+def daraja_request(method, operation, url, **kwargs):
+    """Call the Daraja API, recording the latency of the call by operation and outcome"""
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        response = requests.request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        observe_outbound('daraja', operation, status, time.perf_counter() - started)
+
+def generate_password(timestamp):
+    """Generate the Lipa Na M-Pesa password - format: BusinessShortCode+Passkey+Timestamp"""
+    return base64.b64encode(f"{BUSINESS_SHORT_CODE}{PASSKEY}{timestamp}".encode()).decode('utf-8')
+
 def get_access_token():
-    """Get M-Pesa API access token"""
+    """Get M-Pesa API access token, reusing the cached one while it is still valid"""
+    if _token_cache['access_token'] and time.time() < _token_cache['expires_at']:
+        return {'access_token': _token_cache['access_token']}
+    
     try:
         credentials = base64.b64encode(f"{CONSUMER_KEY}:{CONSUMER_SECRET}".encode()).decode('utf-8')
         
-        response = requests.get(
+        response = daraja_request(
+            'GET', 'oauth',
             f"{API_BASE_URL}{AUTH_ENDPOINT}?grant_type=client_credentials",
             headers={
                 "Authorization": f"Basic {credentials}"
@@ -211,6 +255,10 @@ def get_access_token():
                 'error': f"No access token in response: {data}"
             }
             
+        expires_in = int(data.get('expires_in', 3599))
+        _token_cache['access_token'] = data['access_token']
+        _token_cache['expires_at'] = time.time() + expires_in - TOKEN_EXPIRY_MARGIN
+            
         return {'access_token': data.get('access_token')}
     except requests.exceptions.ConnectionError as e:
         print(f"Connection error: {str(e)}")
@@ -225,6 +273,38 @@ def get_access_token():
         print(f"Unexpected error: {str(e)}")
         return {'error': f"Unexpected error: {str(e)}"}
 
+def query_stk_status(checkout_request_id):
+    """Ask M-Pesa for the result of an STK push (used when the callback never arrived)"""
+    access_token_result = get_access_token()
+    if 'error' in access_token_result:
+        return access_token_result
+    
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    query_request = {
+        "BusinessShortCode": BUSINESS_SHORT_CODE,
+        "Password": generate_password(timestamp),
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_request_id
+    }
+    
+    try:
+        response = daraja_request(
+            'POST', 'stkquery',
+            f"{API_BASE_URL}{STK_QUERY_ENDPOINT}",
+            json=query_request,
+            headers={
+                "Authorization": f"Bearer {access_token_result['access_token']}",
+                "Content-Type": "application/json"
+            },
+            timeout=30
+        )
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"STK query error: {str(e)}")
+        return {'error': f"Request error: {str(e)}"}
+    except ValueError:
+        return {'error': f"Invalid response from M-Pesa: {response.text}"}
+
 def check_internet_connection():
     """Check if internet connection is available"""
     try:
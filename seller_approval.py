@@ -0,0 +1,81 @@
+from models import db, SellerProfile
+from datetime import datetime
+import threading
+import time
+
+SELLER_STATUSES = ('pending', 'approved', 'rejected')
+SELLER_DECISIONS = ('approved', 'rejected')
+
+class SellerStatusCounts:
+    """Number of sellers per approval status for the admin queue badges.
+
+    One grouped COUNT over ix_seller_profile_approval_created, kept for
+    SELLER_COUNTS_TTL seconds. Registrations and decisions in this process
+    move sellers between the cached counts (`adjust`) instead of recounting;
+    other workers catch up on expiry.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self._lock = threading.Lock()
+        self._counts = None
+        self._loaded_at = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SELLER_COUNTS_TTL', 60)
+        self.ttl = app.config['SELLER_COUNTS_TTL']
+        app.extensions['seller_status_counts'] = self
+
+    def get(self):
+        counts = self._counts
+        if counts is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return counts
+        with self._lock:
+            loaded_at = time.monotonic()
+            fresh = dict.fromkeys(SELLER_STATUSES, 0)
+            fresh.update(db.session.query(SellerProfile.approval_status, db.func.count()).group_by(
+                SellerProfile.approval_status
+            ))
+            self._counts, self._loaded_at = fresh, loaded_at
+            return fresh
+
+    def adjust(self, changes, as_of):
+        """Apply {status: delta} for a change committed after monotonic time `as_of`"""
+        with self._lock:
+            # A count read after as_of may already include the change; recount rather than guess
+            if self._counts is None or self._loaded_at >= as_of:
+                self._counts = None
+                return
+            counts = dict(self._counts)
+            for status, delta in changes.items():
+                counts[status] = counts.get(status, 0) + delta
+            self._counts = counts
+
+    def invalidate(self):
+        self._counts = None
+
+def decide_sellers(seller_ids, decision):
+    """Set many sellers' approval status in one UPDATE.
+
+    Approving stamps approved_at; rejecting clears it. Sellers already in
+    that state are left alone so their approval date survives a repeat.
+    Returns how many changed and the {status: delta} this moved, read under
+    row locks in the same transaction so it matches the UPDATE exactly.
+    """
+    changing = SellerProfile.query.filter(
+        SellerProfile.seller_id.in_(seller_ids),
+        SellerProfile.approval_status != decision
+    )
+    changes = {}
+    for (status,) in changing.with_entities(SellerProfile.approval_status).with_for_update():
+        changes[status] = changes.get(status, 0) - 1
+    updated = changing.update({
+        SellerProfile.approval_status: decision,
+        SellerProfile.approved_at: datetime.utcnow() if decision == 'approved' else None
+    }, synchronize_session=False)
+    if updated:
+        changes[decision] = updated
+    db.session.commit()
+    return updated, changes
@@ -0,0 +1,92 @@
+"""Process lifecycle helpers shared by the dev server and gunicorn.conf.py"""
+from models import db
+from concurrent.futures import ThreadPoolExecutor
+import fcntl
+import os
+import time
+
+# Lock files held for the life of the process; see acquire_singleton
+_locks = {}
+
+def acquire_singleton(app, name):
+    """Return True in exactly one process per host for `name` (e.g. one reconciler across workers).
+
+    The lock file lives in LOCK_DIR, by default the app's instance folder.
+    """
+    if name in _locks:
+        return True
+    lock_dir = app.config.get('LOCK_DIR') or app.instance_path
+    os.makedirs(lock_dir, exist_ok=True)
+    handle = open(os.path.join(lock_dir, f"{name}.lock"), 'w')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _locks[name] = handle
+    return True
+
+def prime_db_pool(app):
+    """Open the first WARMUP_DB_CONNECTIONS pooled connections so early requests skip the connect cost"""
+    count = app.config.get('WARMUP_DB_CONNECTIONS', min(app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_size', 1), 4))
+
+    def ping(engine):
+        with engine.connect() as connection:
+            connection.execute(db.text('SELECT 1'))
+            # Hold the connection until all are open, otherwise the pool hands back the same one
+            time.sleep(0.05)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            with ThreadPoolExecutor(count) as pool:
+                list(pool.map(ping, [engine] * count))
+
+def warmup(app):
+    """Fill process-wide caches before serving.
+
+    Runs once in the gunicorn master (preload_app), so the cached catalog
+    and M-Pesa token are shared copy-on-write by every worker. Failures are
+    logged and otherwise ignored: a cold cache is slower, not broken.
+    """
+    from routes.mpesa import get_access_token, is_mpesa_api_reachable
+
+    started = time.perf_counter()
+    with app.test_request_context():
+        try:
+            app.view_functions['api.get_products']()
+        except Exception as e:
+            print(f"Catalog warmup failed: {str(e)}")
+        finally:
+            db.session.remove()
+
+    if is_mpesa_api_reachable():
+        token = get_access_token()
+        if 'error' in token:
+            print(f"M-Pesa token warmup failed: {token['error']}")
+
+    # Connections must not be shared with forked workers; each worker primes its own pool
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    print(f"Warmup finished in {time.perf_counter() - started:.2f}s")
+
+def start_background_workers(app):
+    app.extensions['message_buffer'].start()
+    app.extensions['mpesa_callback_writer'].start()
+    app.extensions['job_runner'].start()
+    # Several reconcilers would query the same payments, so only one process runs it
+    if acquire_singleton(app, 'mpesa-reconciler'):
+        app.extensions['mpesa_reconciler'].start()
+
+def begin_draining(app):
+    """Fail health checks so the load balancer stops routing here, and end SSE streams"""
+    app.extensions['draining'] = True
+    app.extensions['event_broker'].close()
+
+def stop_background_workers(app):
+    """Flush buffered writes and stop worker threads once in-flight requests are done"""
+    begin_draining(app)
+    app.extensions['mpesa_reconciler'].stop(timeout=5)
+    app.extensions['job_runner'].stop(timeout=10)
+    app.extensions['mpesa_callback_writer'].stop(timeout=10)
+    app.extensions['message_buffer'].stop(timeout=10)
@@ -0,0 +1,156 @@
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from datetime import datetime
+import json
+import re
+import threading
+import time
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# Statements EXPLAIN understands on both MySQL and SQLite
+_EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+def fingerprint(statement):
+    """Normalize a statement so executions that differ only in values group together"""
+    normalized = _STRING.sub('?', statement)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _PLACEHOLDER_LIST.sub('(...)', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+class SlowQueryLog:
+    """Opt-in log of SQL statements slower than SLOW_QUERY_THRESHOLD_MS.
+
+    Each slow statement is attributed to the Flask endpoint (or background
+    thread) that ran it and aggregated by fingerprint. The first time a
+    fingerprint is seen its EXPLAIN plan is captured on the same connection,
+    unless the statement streams its result (yield_per, stream_results).
+    Entries are also appended as JSON lines to SLOW_QUERY_LOG_FILE when set.
+    Leave SLOW_QUERY_THRESHOLD_MS unset to install no hooks at all.
+    """
+
+    def __init__(self, app=None):
+        self.threshold = None
+        self.log_file = None
+        self.explain = True
+        self.max_fingerprints = 500
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', None)
+        app.config.setdefault('SLOW_QUERY_LOG_FILE', None)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN', True)
+        app.extensions['slow_query_log'] = self
+
+        if app.config['SLOW_QUERY_THRESHOLD_MS'] is None:
+            return
+        self.threshold = float(app.config['SLOW_QUERY_THRESHOLD_MS']) / 1000
+        self.log_file = app.config['SLOW_QUERY_LOG_FILE']
+        self.explain = app.config['SLOW_QUERY_EXPLAIN']
+
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+            self._listening = True
+
+    @property
+    def enabled(self):
+        return self.threshold is not None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('slow_query_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if elapsed >= self.threshold:
+            options = context.execution_options if context is not None else {}
+            streaming = bool(options.get('stream_results') or options.get('yield_per'))
+            self.record(conn, cursor, statement, parameters, executemany, elapsed, streaming)
+
+    def _handle_error(self, context):
+        started = context.connection.info.get('slow_query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def record(self, conn, cursor, statement, parameters, executemany, elapsed, streaming=False):
+        key = fingerprint(statement)
+        source = request.url_rule.endpoint if has_request_context() and request.url_rule else threading.current_thread().name
+        elapsed_ms = elapsed * 1000
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    return
+                stats = self._stats[key] = {
+                    'fingerprint': key,
+                    'sample': statement,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'sources': {},
+                    'explain': None,
+                    'last_seen': None
+                }
+            # A streamed (server-side cursor) result is still unread on the connection, and an EXPLAIN
+            # there would make the driver discard it; wait for a buffered run of the statement instead
+            needs_explain = self.explain and not executemany and not streaming and stats['explain'] is None
+            if needs_explain:
+                stats['explain'] = []  # claimed, so concurrent runs don't explain it too
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['sources'][source] = stats['sources'].get(source, 0) + 1
+            stats['last_seen'] = datetime.utcnow().isoformat()
+
+        if needs_explain:
+            stats['explain'] = self._explain(conn, cursor, statement, parameters)
+
+        print(f"Slow query ({elapsed_ms:.1f} ms) in {source}: {key}")
+        if self.log_file:
+            entry = {'at': stats['last_seen'], 'ms': round(elapsed_ms, 2), 'source': source,
+                     'fingerprint': key, 'explain': stats['explain'] if needs_explain else None}
+            with self._lock, open(self.log_file, 'a') as log:
+                log.write(json.dumps(entry, default=str) + '\n')
+
+    def _explain(self, conn, cursor, statement, parameters):
+        """Run EXPLAIN with the original parameters on a raw cursor of the same connection"""
+        if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        explain_cursor = None
+        try:
+            # A raw cursor bypasses engine events, so EXPLAIN is never timed or logged itself
+            explain_cursor = cursor.connection.cursor()
+            explain_cursor.execute(prefix + statement, parameters)
+            columns = [column[0] for column in explain_cursor.description or ()]
+            return [dict(zip(columns, row)) for row in explain_cursor.fetchall()]
+        except Exception as e:
+            return [{'error': str(e)}]
+        finally:
+            if explain_cursor is not None:
+                explain_cursor.close()
+
+    def report(self):
+        """Aggregated slow statements, worst total time first"""
+        with self._lock:
+            entries = [dict(stats, sources=dict(stats['sources'])) for stats in self._stats.values()]
+        for entry in entries:
+            entry['avg_ms'] = entry['total_ms'] / entry['count']
+        return sorted(entries, key=lambda entry: entry['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
@@ -30,12 +30,16 @@ interface MessagesDialogProps {
 
 const MessagesDialog = ({ open, onOpenChange, onMessagesLoaded }: MessagesDialogProps) => {
   const [messages, setMessages] = useState<Message[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const { toast } = useToast();
   
-  const fetchMessages = async () => {
+  const fetchMessages = async (cursor?: string) => {
     try {
-      const response = await fetch('http://localhost:5000/api/seller/messages', {
+      const url = cursor
+        ? `http://localhost:5000/api/seller/messages?cursor=${encodeURIComponent(cursor)}`
+        : 'http://localhost:5000/api/seller/messages';
+      const response = await fetch(url, {
         method: 'GET',
         credentials: 'include'
       });
@@ -43,11 +47,12 @@ const MessagesDialog = ({ open, onOpenChange, onMessagesLoaded }: MessagesDialog
       const data = await response.json();
       
       if (data.success) {
-        setMessages(data.messages || []);
+        // Older pages are appended below the ones already shown
+        setMessages(cursor ? [...messages, ...(data.messages || [])] : (data.messages || []));
+        setNextCursor(data.nextCursor || null);
         
-        // Count unread messages
-        const unreadCount = data.messages.filter((msg: Message) => !msg.isRead).length;
-        onMessagesLoaded(unreadCount);
+        // The unread count covers the whole inbox, not just this page
+        onMessagesLoaded(data.unreadCount || 0);
       } else {
         toast({
           title: "Error",
@@ -89,11 +94,7 @@ const MessagesDialog = ({ open, onOpenChange, onMessagesLoaded }: MessagesDialog
         ));
         
         // Update the unread count
-        const updatedUnreadCount = messages.filter(msg => 
-          msg.id !== messageId && !msg.isRead
-        ).length;
-        
-        onMessagesLoaded(updatedUnreadCount);
+        onMessagesLoaded(data.unreadCount || 0);
       } else {
         toast({
           title: "Error",
@@ -156,6 +157,13 @@ const MessagesDialog = ({ open, onOpenChange, onMessagesLoaded }: MessagesDialog
                 <p>{message.message}</p>
               </div>
             ))}
+            {nextCursor && (
+              <div className="flex justify-center">
+                <Button variant="outline" size="sm" onClick={() => fetchMessages(nextCursor)}>
+                  Load older messages
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </DialogContent>
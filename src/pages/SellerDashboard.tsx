@@ -118,6 +118,28 @@ const SellerDashboard = () => {
     checkAuth();
   }, []);
 
+  // Live unread count and new-order notices instead of polling
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    
+    const events = new EventSource('http://localhost:5000/api/seller/events', { withCredentials: true });
+    
+    events.addEventListener('message', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      setMessageCount(data.unreadCount || 0);
+    });
+    
+    events.addEventListener('order', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      toast({
+        title: "New order",
+        description: `Order ${data.orderNumber} includes your products`,
+      });
+    });
+    
+    return () => events.close();
+  }, [isAuthenticated, toast]);
+
   const handleLogout = async () => {
     try {
       await fetch('http://localhost:5000/api/logout', {
@@ -83,6 +83,14 @@ export default function Orders() {
           <h2 className="text-sm font-medium text-gray-500">KukuHub</h2>
           <h1 className="text-2xl font-bold">Orders Management</h1>
         </div>
+        <div className="ml-auto flex gap-2">
+          <Button variant="outline" asChild>
+            <a href="http://localhost:5000/api/orders/admin/export?format=csv">Export CSV</a>
+          </Button>
+          <Button variant="outline" asChild>
+            <a href="http://localhost:5000/api/orders/admin/export?format=ndjson">Export NDJSON</a>
+          </Button>
+        </div>
       </div>
 
       {isLoading ? (
@@ -104,6 +104,18 @@ const SellerOrders = () => {
     }
   };
 
+  // Refresh the list as soon as an order with this seller's products comes in
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    
+    const events = new EventSource('http://localhost:5000/api/seller/events', { withCredentials: true });
+    events.addEventListener('order', () => {
+      fetchOrders();
+    });
+    
+    return () => events.close();
+  }, [isAuthenticated]);
+
   const handleStatusUpdate = async (orderId: string, newStatus: string) => {
     if (!isAuthenticated) {
       toast({
@@ -195,6 +207,11 @@ const SellerOrders = () => {
               Back
             </Button>
             <h1 className="text-2xl font-bold">Orders</h1>
+            {isAuthenticated && (
+              <Button variant="outline" className="ml-auto" asChild>
+                <a href="http://localhost:5000/api/orders/seller/export?format=csv">Export CSV</a>
+              </Button>
+            )}
           </div>
           <p className="text-sm text-gray-600">Manage your customer orders</p>
           
@@ -0,0 +1,31 @@
+"""Run background job workers without serving HTTP: python worker.py
+
+Queues and thread counts come from JOB_QUEUES (e.g. "default=4,notifications=2").
+
+Tasks that publish SSE events (the `notifications` queue) only reach sellers
+connected to the process that publishes them unless EVENTS_REDIS_URL is set.
+Without it this worker leaves those queues to the web processes' job runners.
+"""
+from app import create_app, job_runner
+from jobs import TASKS
+import signal
+import threading
+
+if __name__ == '__main__':
+    app = create_app()
+    if not app.config.get('EVENTS_REDIS_URL'):
+        # Events published here would reach no subscribers, so don't claim these jobs
+        event_queues = {spec['queue'] for spec in TASKS.values() if spec['publishes_events']}
+        app.config['JOB_QUEUES'] = dict(app.config['JOB_QUEUES'], **dict.fromkeys(event_queues, 0))
+        if event_queues:
+            print(f"EVENTS_REDIS_URL is not set; leaving {', '.join(sorted(event_queues))} to the web processes")
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    job_runner.start()
+    print(f"Job workers running for {job_runner.queues()}")
+    try:
+        stopping.wait()
+    except KeyboardInterrupt:
+        pass
+    # Running jobs finish before the process exits
+    job_runner.stop(timeout=30)
@@ -0,0 +1,6 @@
+"""WSGI entrypoint for production servers: gunicorn -c gunicorn.conf.py"""
+from app import create_app
+from server import warmup
+
+app = create_app()
+warmup(app)